@@ -0,0 +1,131 @@
+from argparse import ArgumentParser
+from os import path
+import json
+import os
+import sys
+
+import common
+import MemTraffic
+import stats
+
+bisect_cache_file = path.join(common.cli_test_dir, "bisect-cache.json")
+
+
+def load_cache():
+    try:
+        with open(bisect_cache_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache):
+    tmp_file = bisect_cache_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(cache, f, indent=4)
+    os.replace(tmp_file, bisect_cache_file)
+
+
+def cache_key(build_dir, project_name, cmake_generator, metric, attempts):
+    # the build is identified by its directory and the time inspectcode was built
+    exe_mtime = path.getmtime(path.join(build_dir, common.inspect_code_exe))
+    gen_name = cmake_generator[0] if cmake_generator else None
+    return json.dumps([path.abspath(build_dir), exe_mtime, project_name, gen_name, metric, attempts if metric == "time" else None])
+
+
+def measure_time(build_dir, project, project_dir, sln_file, attempts):
+    inspect_code_args, _ = common.inspect_code_run_arguments(project_dir, sln_file, project.get("project to check"), project.get("msbuild properties"))
+    inspect_code_args.insert(0, path.join(build_dir, common.inspect_code_exe))
+    status, _ = common.run_and_trace(inspect_code_args)
+    common.check_status(status)
+    result = []
+    for attempt in range(attempts):
+        status, _ = common.run_and_trace(inspect_code_args)
+        common.check_status(status)
+        # a retried attempt is timed by its last run only
+        result.append(status.elapsed)
+    summary = stats.summary(result)
+    summary["value"] = summary["median"]
+    summary["attempts"] = result
+    return summary
+
+
+def measure_traffic(build_dir, project_name, project, project_dir, sln_file):
+    profiler_dir = common.env.get("profiler directory") or build_dir
+    snapshot_dir = path.join(MemTraffic.snapshots_home, project_name + "-bisect")
+    traffic = MemTraffic.measure_traffic(project, project_dir, sln_file, snapshot_dir,
+                                         path.join(build_dir, common.inspect_code_exe), MemTraffic.profiler_tools(profiler_dir))
+    if traffic is None:
+        sys.exit("inspectcode from {0} inspected unexpected count of files".format(build_dir))
+    return {"value": traffic}
+
+
+def measure(cache, build_dir, project_name, project, cmake_generator, prepared, args):
+    key = cache_key(build_dir, project_name, cmake_generator, args.metric, args.attempts)
+    if key in cache:
+        print("{0}: {1} (cached)".format(build_dir, cache[key]["value"]), flush=True)
+        return cache[key]
+    project_dir, sln_file = prepared
+    if args.metric == "time":
+        result = measure_time(build_dir, project, project_dir, sln_file, args.attempts)
+    else:
+        result = measure_traffic(build_dir, project_name, project, project_dir, sln_file)
+    print("{0}: {1}".format(build_dir, result["value"]), flush=True)
+    cache[key] = result
+    save_cache(cache)
+    return result
+
+
+def bisect(builds, is_bad):
+    # builds are ordered from old to new; returns the index of the first bad build, assuming the first one is good
+    good, bad = 0, len(builds) - 1
+    if is_bad(good):
+        return None
+    if not is_bad(bad):
+        return None
+    while bad - good > 1:
+        middle = (good + bad) // 2
+        if is_bad(middle):
+            bad = middle
+        else:
+            good = middle
+    return bad
+
+
+argparser = ArgumentParser(description="find the first inspectcode build whose metric exceeds the threshold")
+argparser.add_argument("builds", nargs="+", help="build directories ordered from old to new")
+argparser.add_argument("-p", "--project", dest="project", required=True)
+argparser.add_argument("-g", "--generator", dest="generator", help="cmake generator from \"VS CMake Generators\"")
+argparser.add_argument("--metric", dest="metric", choices=["time", "traffic"], default="time")
+argparser.add_argument("--threshold", dest="threshold", type=float, required=True,
+                       help="seconds for 'time' (median of attempts) or MB for 'traffic'")
+argparser.add_argument("--attempts", dest="attempts", type=int, default=5)
+
+if __name__ == "__main__":
+    args = argparser.parse_args()
+    project = common.read_conf_if_needed(common.projects[args.project])
+    generators = common.cmake_generators(project)
+    if args.generator:
+        generators = [g for g in generators if g and g[0] == args.generator]
+        if not generators:
+            sys.exit("project {0} doesn't use generator {1}".format(args.project, args.generator))
+    cmake_generator = generators[0]
+    prepared = common.prepare_project(args.project, project, cmake_generator)
+    common.enforce_disk_budget([path.join(common.projects_dir, args.project)])
+
+    cache = load_cache()
+    results = {}
+
+    def is_bad(index):
+        results[index] = measure(cache, args.builds[index], args.project, project, cmake_generator, prepared, args)
+        return results[index]["value"] > args.threshold
+
+    culprit = bisect(args.builds, is_bad)
+    if culprit is None:
+        if results[0]["value"] > args.threshold:
+            sys.exit("the first build {0} already exceeds the threshold".format(args.builds[0]))
+        sys.exit("the last build {0} doesn't exceed the threshold".format(args.builds[-1]))
+    print("last good build:  {0}".format(args.builds[culprit - 1]))
+    print(json.dumps(results[culprit - 1], indent=4))
+    print("first bad build:  {0}".format(args.builds[culprit]))
+    print(json.dumps(results[culprit], indent=4))
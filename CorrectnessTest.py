@@ -1,11 +1,20 @@
-from subprocess import Popen, PIPE
 import subprocess
 from os import path
-import xml.etree.ElementTree as ET
 import json
+import os
+import sys
+import tempfile
 import time
 
 import common
+import inspection_cache
+import report
+import scheduler
+import storage
+
+
+inspection_cache_dir = path.join(common.cli_test_dir, "inspection-cache")
+inspection_cache_size = common.env.get("inspection cache size", 2048) << 20
 
 
 def print_errors(title, errors):
@@ -16,8 +25,8 @@ def print_errors(title, errors):
                 
 
 def check_report(report_file, known_errors):
-    issue_nodes = ET.parse(report_file).getroot().findall("Issues")[0]
-    if len(issue_nodes) == 0:
+    errors = report.read_report(report_file)
+    if len(errors) == 0:
         print("No compilation errors found")
         if known_errors:
             print("But {0} errors were expected".format(len(known_errors)))
@@ -25,9 +34,8 @@ def check_report(report_file, known_errors):
         else:
             return None
     else:
-        errors = set([(issue.get("File"), issue.get("Line"), issue.get("Message")) for issue in issue_nodes.iter("Issue")])
         if known_errors:
-            expected_errors = set([(issue["file"], issue["line"], issue["message"]) for issue in known_errors])
+            expected_errors = report.index_known_errors(known_errors)
             unexpected_errors = errors.difference(expected_errors)
             missing_errors = expected_errors.difference(errors)
             print_errors("Unexpected", unexpected_errors)
@@ -39,84 +47,190 @@ def check_report(report_file, known_errors):
             else:
                 return "expected and actual set of errors differ"
         else:
-            print_errors("Unexpected", errors)
+            print_errors("Unexpected", errors.difference(report.IssueIndex()))
             return "unexpected {0} errors found".format(len(errors))
 
 
 def run_inspect_code(project_dir, sln_file, project_to_check, msbuild_props):
     args, report_file = common.inspect_code_run_arguments(project_dir, sln_file, project_to_check, msbuild_props)
     args.insert(0, common.inspect_code_path)
+    if inspect_code_jobs:
+        args.append("-j={0}".format(inspect_code_jobs))
     print(subprocess.list2cmdline(args))
-    process = Popen(args, stdout=PIPE, text=True)
     start = time.time()
-    out, err = process.communicate()
-    exit_code = process.wait()
+    status, timeline = common.run_and_trace(args)
     end = time.time()
-    if exit_code != 0:
-        print("Error: exit code = " + str(exit_code))
-    if err:
-        print("Error:")
-        print(err)
+    if not status.succeeded():
+        print("Error: " + status.describe())
     print("Elapsed time: " + common.duration(start, end))
-    return report_file, out
+    return report_file, timeline, status
+
+
+def inspection_cache_key(project, cmake_generator, project_dir, sln_file, project_to_check, msbuild_props):
+    args, report_file = common.inspect_code_run_arguments(project_dir, sln_file, project_to_check, msbuild_props)
+    build_digest = inspection_cache.build_hash(common.resharper_build, inspection_cache_dir)
+    if cmake_generator:
+        _, gen_description = cmake_generator
+        configuration = common.configure_fingerprint(project, gen_description)
+    else:
+        configuration = project.get("custom build tool")
+    return inspection_cache.cache_key(build_digest, project, configuration, sln_file, args), report_file
 
 
-def check_project(project, project_dir, sln_file):
+def check_project(project, cmake_generator, project_dir, sln_file):
+    # returns the result and the status of inspectcode, which is None when the results are taken from the cache
     project_to_check = project.get("project to check")
     msbuild_props = project.get("msbuild properties")
-    report_file, output = run_inspect_code(project_dir, sln_file, project_to_check, msbuild_props)
+    cached = None
+    status = None
+    if use_inspection_cache:
+        key, report_file = inspection_cache_key(project, cmake_generator, project_dir, sln_file, project_to_check, msbuild_props)
+        cached = inspection_cache.lookup(inspection_cache_dir, key, report_file)
+    if cached:
+        print("inspection results are taken from the cache")
+        actual_files_count = cached["inspected files count"]
+    else:
+        report_file, timeline, status = run_inspect_code(project_dir, sln_file, project_to_check, msbuild_props)
+        if status.is_infrastructure_failure():
+            return "inspectcode " + status.describe(), status
+        actual_files_count = timeline.inspected_files_count()
+        if use_inspection_cache and status.succeeded():
+            inspection_cache.store(inspection_cache_dir, key, report_file, {"inspected files count": actual_files_count},
+                                   inspection_cache_size)
     expected_files_count = project.get("inspected files count")
-    actual_files_count = common.inspected_files_count(output)
     if expected_files_count:
         if expected_files_count != actual_files_count:
             print("expected count of inspected files is {0}, but actual is {1}".format(expected_files_count, actual_files_count))
     else:
         print("count of inspected files is ", actual_files_count)
-    return check_report(report_file, project.get("known errors"))
+    return check_report(report_file, project.get("known errors")), status
 
 
-def process_project_with_cmake_generator(project, project_name, cmake_generator):
+def prepare_project(project_name, project, cmake_generator):
     project_dir, sln_file = common.prepare_project(project_name, project, cmake_generator)
-    result = check_project(project, project_dir, sln_file)
-    if result:
+    # concurrently checked projects share caches-home, their own artifacts are marked as in use
+    common.enforce_disk_budget([path.join(common.projects_dir, project_name), common.caches_home])
+    return project_dir, sln_file
+
+
+def process_project_with_cmake_generator(project, project_name, cmake_generator):
+    start = time.time()
+    project_dir, sln_file = prepare_project(project_name, project, cmake_generator)
+    result, status = check_project(project, cmake_generator, project_dir, sln_file)
+    if status:
+        # a cache hit costs only the preparation, it would make the project look cheap for scheduling and sharding
+        common.record_duration("CorrectnessTest", project_name, cmake_generator, time.time() - start)
+    if result and cmake_generator:
         name, _ = cmake_generator
-        return "(" + name + ") " + result
+        return "(" + name + ") " + result, status
+    return result, status
 
 
 def process_project(project_name, project):
+    # returns the result and the inspectcode status per generator, None for results taken from the cache
     project = common.read_conf_if_needed(project)
-
-    if "custom build tool" in project:
-        project_dir, sln_file = common.prepare_project(project_name, project, None)
-        return check_project(project, project_dir, sln_file)
-
-    supported_generators = common.env["VS CMake Generators"]
-    project_generators = project.get("cmake generators")
-
-    if project_generators:
-        for generator in project_generators:
-            result = process_project_with_cmake_generator(project, project_name, (generator, supported_generators[generator]))
+    runs = {}
+    with storage.in_use(common.cli_test_dir, project_name):
+        for cmake_generator in common.cmake_generators(project):
+            result, status = process_project_with_cmake_generator(project, project_name, cmake_generator)
+            runs[common.generator_name(cmake_generator)] = status.to_json() if status else None
             if result:
-                return result
-    else:
-        for cmake_generator in supported_generators.items():
-            result = process_project_with_cmake_generator(project, project_name, cmake_generator)
-            if result:
-                return result
-
+                return result, runs
+    return None, runs
+
+
+def child_arguments():
+    # the options which affect checking of a single project
+    result = ["--concurrency", str(args.concurrency)]
+    if args.timeout is not None:
+        result += ["--timeout", str(args.timeout)]
+    if args.stall_timeout is not None:
+        result += ["--stall-timeout", str(args.stall_timeout)]
+    if args.retries is not None:
+        result += ["--retries", str(args.retries)]
+    if not args.use_inspection_cache:
+        result.append("--no-cache")
+    return result
+
+
+def run_concurrently(project_items):
+    results = {}
+    runs = {}
+    costs = common.estimated_costs(project_items, common.load_durations("CorrectnessTest"))
+    memory = {name: project.get("peak memory", args.memory_per_project) for name, project in project_items}
+    tasks = [(name, costs[name], memory[name]) for name, _ in project_items]
+    result_files = {}
+
+    def launch(project_name, slots, output):
+        result_file = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+        result_file.close()
+        result_files[project_name] = result_file.name
+        print("processing project {0} with -j={1}...".format(project_name, slots), flush=True)
+        return scheduler.launch_script([sys.executable, path.abspath(__file__), "-p", project_name,
+                                        "-j", str(slots), "--result-file", result_file.name] + child_arguments(), output)
+
+    def on_finish(project_name, exit_code, output, elapsed):
+        print("project {0} finished in {1}:".format(project_name, common.duration(0, elapsed)))
+        print(output, end="")
+        print('-------------------------------------------------------', flush=True)
+        try:
+            with open(result_files[project_name]) as f:
+                project_result = json.load(f)
+            results[project_name] = project_result["result"]
+            runs[project_name] = project_result.get("runs")
+        except (OSError, ValueError, KeyError):
+            results[project_name] = "failed with exit code {0}".format(exit_code)
+        os.remove(result_files[project_name])
+
+    scheduler.run_scheduled(tasks, args.concurrency, args.cores, args.memory_budget, launch, on_finish)
+    return [(name, results[name]) for name, _ in project_items], runs
+
+
+def run_serially(project_items):
+    results = []
+    runs = {}
+    for project_name, project in project_items:
+        print("processing project {0}...".format(project_name), flush=True)
+        result, runs[project_name] = process_project(project_name, project)
+        results.append((project_name, result))
+        print('-------------------------------------------------------', flush=True)
+    return results, runs
+
+
+common.argparser.add_argument("-j", "--jobs", dest="jobs", type=int,
+                              help="count of threads used by inspectcode")
+common.argparser.add_argument("--result-file", dest="result_file")
+common.argparser.add_argument("--no-cache", dest="use_inspection_cache", action='store_false',
+                              help="always run inspectcode even if the results for the same inputs are cached")
+common.argparser.add_argument("--concurrency", dest="concurrency", type=int, default=1,
+                              help="count of projects checked at once")
+common.argparser.add_argument("--cores", dest="cores", type=int, default=os.cpu_count(),
+                              help="cores shared between concurrently checked projects")
+common.argparser.add_argument("--memory-budget", dest="memory_budget", type=float, default=0,
+                              help="memory (GB) shared between concurrently checked projects, 0 means unlimited")
+common.argparser.add_argument("--memory-per-project", dest="memory_per_project", type=float, default=4,
+                              help="memory (GB) estimate for projects without \"peak memory\" in the config")
 args = common.argparser.parse_args()
+common.apply_run_limits(args)
+inspect_code_jobs = args.jobs
+use_inspection_cache = args.use_inspection_cache
 if args.project:
-    process_project(args.project, common.projects[args.project])
+    result, runs = process_project(args.project, common.projects[args.project])
+    if args.result_file:
+        with open(args.result_file, "w") as f:
+            json.dump({"result": result, "runs": runs}, f)
 else:
-    summary = []
     start_time = time.time()
 
-    for project_name, project in common.projects.items():
-        print("processing project {0}...".format(project_name), flush=True)
-        result = process_project(project_name, project)
-        if result:
-            summary.append(project_name + ": " + result)
-        print('-------------------------------------------------------', flush=True)
+    project_items = common.selected_projects(args, "CorrectnessTest")
+    common.install_dependencies(project_items)
+    if args.concurrency > 1:
+        results, runs = run_concurrently(project_items)
+    else:
+        results, runs = run_serially(project_items)
+    summary = [project_name + ": " + result for project_name, result in results if result]
+    if args.summary_file:
+        common.write_summary(args.summary_file, "CorrectnessTest", results, runs)
 
     print("Total time: " + common.duration(start_time, time.time()))
     if len(summary) == 0:
@@ -0,0 +1,14 @@
+from argparse import ArgumentParser
+
+import common
+import storage
+
+argparser = ArgumentParser(description="show disk usage of checkouts, build directories, caches and snapshots")
+argparser.add_argument("--budget", dest="budget", type=float,
+                       help="evict least recently used artifacts until they fit into the budget (GB)")
+args = argparser.parse_args()
+
+if args.budget is not None:
+    evicted, total = storage.enforce_budget(common.cli_test_dir, int(args.budget * (1 << 30)))
+    print("{0} artifacts evicted".format(len(evicted)))
+storage.report(common.cli_test_dir)
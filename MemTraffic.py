@@ -1,84 +1,242 @@
 from argparse import ArgumentParser
 from os import path, makedirs
 import json
+import os
 from subprocess import PIPE
 import shutil
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
 
+import allocations
 import common
+import runner
+import storage
+
+
+def profiler_tools(profiler_dir):
+    return path.join(profiler_dir, "ConsoleProfiler.exe"), path.join(profiler_dir, "JetBrains.Timeline.Tools.Snapshot.Dumper.exe")
+
 
 profiler_dir = common.env.get("profiler directory")
 if not profiler_dir:
     profiler_dir = common.resharper_build
 
-console_profiler = path.join(profiler_dir, "ConsoleProfiler.exe")
-snapshot_dumper  = path.join(profiler_dir, "JetBrains.Timeline.Tools.Snapshot.Dumper.exe")
+console_profiler, snapshot_dumper = profiler_tools(profiler_dir)
 
 snapshots_home = path.join(common.cli_test_dir, "snapshots-home")
 makedirs(snapshots_home, exist_ok=True)
+traffic_history_file = path.join(snapshots_home, "traffic-history.json")
+traffic_history_size = 20
 
-def process_project(project_name, project):
-    start_time = time.time()
+# "args" are passed to an additional dumper run, "files" map kinds (e.g. "types", "stacks") to the produced
+# totals; by default every snapshot.dtt.alloc.<kind>.txt next to the snapshot is taken
+breakdown_config = common.env.get("allocation breakdown", {})
+breakdown_files = breakdown_config.get("files")
+baseline_size = breakdown_config.get("baseline size", 200)
 
-    project = common.read_conf_if_needed(project)
-    project_dir, sln_file = common.prepare_project(project_name, project)
 
+def profile(project, project_dir, sln_file, snapshot_dir, inspect_code_path=common.inspect_code_path, profiler=console_profiler, cores=None):
     project_to_check = project.get("project to check")
     msbuild_props = project.get("msbuild properties")
     inspect_code_args, report_file = common.inspect_code_run_arguments(project_dir, sln_file, project_to_check, msbuild_props)
     inspect_code_args.append("-j=1") # reduce nondetermenism
     #inspect_code_args.append("--debug")
-    snapshot_dir = path.join(snapshots_home, project_name)
     makedirs(snapshot_dir, exist_ok=True)
     snapshot_path = path.join(snapshot_dir, "snapshot.dtt")
-    profiler_args = [console_profiler, "start", "--profiling-type=Timeline",
+    profiler_args = [profiler, "start", "--profiling-type=Timeline",
                      "--disable-tpl", "--overwrite", "--save-to=" + snapshot_path,
-                     common.inspect_code_path, "--"] + inspect_code_args 
+                     inspect_code_path, "--"] + inspect_code_args 
     #print(subprocess.list2cmdline(profiler_args))
-    process = subprocess.Popen(profiler_args, stdout=PIPE, text=True)
-    out, err = process.communicate()
-    exit_code = process.wait()
-    if exit_code != 0:
-        print("Error: exit code = " + str(exit_code))
-    if err:
-        print("Error:")
-        print(err)
+    status, timeline = common.run_and_trace(profiler_args, cores=cores)
+    if not status.succeeded():
+        print("Error: " + status.describe())
+        if status.is_infrastructure_failure():
+            return None
 
     expected_files_count = project["inspected files count"]
-    actual_files_count = common.inspected_files_count(out)
+    actual_files_count = timeline.inspected_files_count()
     if expected_files_count != actual_files_count:
-        print(out)
+        print(timeline.output())
         print("expected count of inspected files is {0}, but actual is {1}".format(expected_files_count, actual_files_count))
         return None
+    return snapshot_path
+
+
+def run_dumper(args, cores):
+    process = subprocess.Popen(args, stdout=PIPE, **runner.pinned(cores))
+    runner.pin_started(process.pid, cores)
+    process.communicate()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args)
 
-    subprocess.run([snapshot_dumper, "-i", snapshot_path, "-A"], check=True, stdout=PIPE)
+
+def dump(snapshot_path, dumper=snapshot_dumper, cores=None):
+    snapshot_dir = path.dirname(snapshot_path)
+    run_dumper([dumper, "-i", snapshot_path, "-A"], cores)
+    breakdown_args = breakdown_config.get("args")
+    if breakdown_args:
+        run_dumper([dumper, "-i", snapshot_path] + breakdown_args, cores)
     with open(path.join(snapshot_dir, "snapshot.dtt.alloc.stats.txt")) as f:
-        actual_traffic = int(f.read()) // (1 << 20)
+        return int(f.read()) // (1 << 20)
+
+
+def measure_traffic(project, project_dir, sln_file, snapshot_dir, inspect_code_path=common.inspect_code_path, tools=(console_profiler, snapshot_dumper)):
+    profiler, dumper = tools
+    snapshot_path = profile(project, project_dir, sln_file, snapshot_dir, inspect_code_path, profiler)
+    if snapshot_path is None:
+        return None
+    return dump(snapshot_path, dumper)
+
+
+def dump_and_read_breakdown(snapshot_path):
+    traffic = dump(snapshot_path, cores=common.env.get("dump cores"))
+    return traffic, read_breakdown(path.dirname(snapshot_path))
+
+
+def discover_breakdown_files(snapshot_dir):
+    prefix, suffix = "snapshot.dtt.alloc.", ".txt"
+    result = {}
+    for file_name in os.listdir(snapshot_dir):
+        if file_name.startswith(prefix) and file_name.endswith(suffix) and file_name != "snapshot.dtt.alloc.stats.txt":
+            result[file_name[len(prefix):-len(suffix)]] = file_name
+    return result
+
+
+def read_breakdown(snapshot_dir):
+    result = {}
+    for kind, file_name in (breakdown_files or discover_breakdown_files(snapshot_dir)).items():
+        file_path = path.join(snapshot_dir, file_name)
+        if path.exists(file_path):
+            totals = allocations.parse_breakdown(file_path)
+            if totals:
+                result[kind] = allocations.compact(totals, baseline_size)
+    return result
+
+
+def traffic_history(project_name):
+    return allocations.load_json(traffic_history_file, {}).get(project_name, [])
+
 
+def record_traffic(project_name, traffic):
+    history = allocations.load_json(traffic_history_file, {})
+    history[project_name] = (history.get(project_name, []) + [traffic])[-traffic_history_size:]
+    allocations.save_json(traffic_history_file, history)
+
+
+def analyze(project_name, project, snapshot_dir, actual_traffic, breakdown):
+    storage.touch(common.cli_test_dir, snapshot_dir, "snapshot", project_name)
+    baseline_file = path.join(snapshots_home, project_name + ".baseline.json")
     expected_traffic = project.get("mem traffic")
     if expected_traffic:
         relative_delta = (actual_traffic - expected_traffic) / expected_traffic * 100
-        if abs(relative_delta) < (3.0 if expected_traffic < 1000 else 0.5):
+        allowed_delta = allocations.tolerance(traffic_history(project_name), expected_traffic)
+        print("expected traffic is {0} MB, actual traffic is {1} MB; delta = {2:.2f}% (tolerance {3:.2f}%)"
+              .format(expected_traffic, actual_traffic, relative_delta, allowed_delta), flush=True)
+        if abs(relative_delta) < allowed_delta:
+            # only accepted runs make up the history, otherwise a regression would widen its own tolerance
+            record_traffic(project_name, actual_traffic)
+            if breakdown:
+                allocations.save_json(baseline_file, dict(breakdown, traffic=actual_traffic))
             shutil.rmtree(snapshot_dir)
-        print("expected traffic is {0} MB, actual traffic is {1} MB; delta = {2:.2f}%"
-              .format(expected_traffic, actual_traffic, relative_delta), flush=True)
+        elif not breakdown:
+            print("no allocation breakdown was produced, see \"allocation breakdown\" in environment.json")
+        else:
+            baseline = allocations.load_json(baseline_file, None)
+            if baseline:
+                diff = {kind: allocations.top_growth(baseline.get(kind, {}), totals, 20) for kind, totals in breakdown.items()}
+                diff["baseline traffic"] = baseline["traffic"]
+                allocations.save_json(path.join(snapshot_dir, "allocation-diff.json"), diff)
+                for kind, growth in diff.items():
+                    if kind != "baseline traffic":
+                        allocations.print_growth(kind, growth[:10])
     else:
+        record_traffic(project_name, actual_traffic)
         print("traffic is {0} MB".format(actual_traffic), flush=True)
+    return actual_traffic
+
+
+def traffic_cmake_generator(project):
+    # traffic is measured once per project, with its first generator
+    return common.cmake_generators(project)[0]
+
+
+def timed_profile(project_name, project, project_dir, sln_file, snapshot_dir):
+    # dumping overlaps with the next project, so the profiling is what a shard spends on a project
+    start = time.time()
+    snapshot_path = profile(project, project_dir, sln_file, snapshot_dir, cores=common.env.get("profiling cores"))
+    common.record_duration("MemTraffic", project_name, traffic_cmake_generator(project), time.time() - start)
+    return snapshot_path
+
+
+def process_project(project_name, project):
+    start_time = time.time()
+
+    project = common.read_conf_if_needed(project)
+    project_dir, sln_file = common.prepare_project(project_name, project, traffic_cmake_generator(project))
+    common.enforce_disk_budget([path.join(common.projects_dir, project_name)])
+
+    snapshot_dir = path.join(snapshots_home, project_name)
+    snapshot_path = timed_profile(project_name, project, project_dir, sln_file, snapshot_dir)
+    if snapshot_path is None:
+        return None
+    actual_traffic, breakdown = dump_and_read_breakdown(snapshot_path)
+    analyze(project_name, project, snapshot_dir, actual_traffic, breakdown)
 
     elapsed_time = common.duration(start_time, time.time())
     print("elapsed time: {0}".format(elapsed_time), flush=True)
+    return actual_traffic
 
 
-args = common.argparser.parse_args()
-if args.project:
-    process_project(args.project, common.projects[args.project])
-else:
-    start_time = time.time()
+def process_projects_pipelined(project_items):
+    # While project N is profiled (single-threaded, on "profiling cores" if specified), project N + 1 is being
+    # prepared (on "preparation cores") and the snapshot of project N - 1 is being dumped (on "dump cores").
+    # Only the child processes are pinned, the harness itself isn't, so unpinned stages aren't confined to
+    # the profiling cores.
+    work_items = [(name, project, traffic_cmake_generator(project)) for name, project in project_items]
+    results = []
+    dumped = None
+    # the snapshot being dumped must survive the disk budget enforcement
+    dumped_snapshots = set()
+
+    def finish_dumped():
+        project_name, project, snapshot_dir, future = dumped
+        print("analyzing project {0}...".format(project_name), flush=True)
+        actual_traffic, breakdown = future.result()
+        dumped_snapshots.discard(snapshot_dir)
+        results.append((project_name, analyze(project_name, project, snapshot_dir, actual_traffic, breakdown)))
+
+    with ThreadPoolExecutor(max_workers=1) as dump_executor:
+        for project_name, project, _, project_dir, sln_file in common.prepare_ahead(work_items, dumped_snapshots):
+            print("profiling project {0}...".format(project_name), flush=True)
+            snapshot_dir = path.join(snapshots_home, project_name)
+            snapshot_path = timed_profile(project_name, project, project_dir, sln_file, snapshot_dir)
+            if dumped:
+                finish_dumped()
+                dumped = None
+            if snapshot_path is None:
+                results.append((project_name, None))
+            else:
+                dumped_snapshots.add(snapshot_dir)
+                dumped = (project_name, project, snapshot_dir, dump_executor.submit(dump_and_read_breakdown, snapshot_path))
+            print('-------------------------------------------------------', flush=True)
+        if dumped:
+            finish_dumped()
+    return results
+
+
+if __name__ == "__main__":
+    args = common.argparser.parse_args()
+    common.apply_run_limits(args)
+    if args.project:
+        process_project(args.project, common.projects[args.project])
+    else:
+        start_time = time.time()
 
-    for project_name, project in common.projects.items():
-        print("processing project {0}...".format(project_name), flush=True)
-        process_project(project_name, project)
-        print('-------------------------------------------------------', flush=True)
+        project_items = common.selected_projects(args, "MemTraffic", generators=lambda project: [traffic_cmake_generator(project)])
+        common.install_dependencies(project_items)
+        results = process_projects_pipelined(project_items)
+        if args.summary_file:
+            common.write_summary(args.summary_file, "MemTraffic", results)
 
-    print("Total time: " + common.duration(start_time, time.time()))
\ No newline at end of file
+        print("Total time: " + common.duration(start_time, time.time()))
@@ -0,0 +1,32 @@
+from argparse import ArgumentParser
+import json
+
+import stats
+
+argparser = ArgumentParser(description="merge durations.json files of several hosts into one file for --durations")
+argparser.add_argument("durations_files", nargs="+")
+argparser.add_argument("-o", "--output", dest="output", required=True)
+args = argparser.parse_args()
+
+# kind -> project -> generator -> seconds recorded by every host
+collected = {}
+for durations_file in args.durations_files:
+    with open(durations_file) as f:
+        all_durations = json.load(f)
+    for kind, projects in all_durations.items():
+        for project_name, generators in projects.items():
+            if not isinstance(generators, dict):
+                # recorded before durations were kept per generator
+                continue
+            for generator, seconds in generators.items():
+                collected.setdefault(kind, {}).setdefault(project_name, {}).setdefault(generator, []).append(seconds)
+
+# hosts differ in speed, the median keeps a single slow or fast host from skewing the balance
+merged = {kind: {project_name: {generator: stats.median(seconds) for generator, seconds in generators.items()}
+                 for project_name, generators in projects.items()}
+          for kind, projects in collected.items()}
+with open(args.output, "w") as f:
+    json.dump(merged, f, indent=4, sort_keys=True)
+
+for kind, projects in sorted(merged.items()):
+    print("{0}: {1} projects".format(kind, len(projects)))
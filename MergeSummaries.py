@@ -0,0 +1,47 @@
+from argparse import ArgumentParser
+import json
+import sys
+
+argparser = ArgumentParser(description="merge --summary-file outputs of several shards")
+argparser.add_argument("summary_files", nargs="+")
+argparser.add_argument("-o", "--output", dest="output")
+args = argparser.parse_args()
+
+kind = None
+results = {}
+runs = {}
+for summary_file in args.summary_files:
+    with open(summary_file) as f:
+        summary = json.load(f)
+    if kind and summary["kind"] != kind:
+        sys.exit("cannot merge {0} summary with {1} summary".format(summary["kind"], kind))
+    kind = summary["kind"]
+    for project_name, result in summary["results"].items():
+        if project_name in results:
+            print("project {0} is present in several summaries".format(project_name))
+        results[project_name] = result
+    runs.update(summary.get("runs", {}))
+
+if args.output:
+    with open(args.output, "w") as f:
+        merged = {"kind": kind, "results": results}
+        if runs:
+            merged["runs"] = runs
+        json.dump(merged, f, indent=4)
+
+print("{0} projects".format(len(results)))
+if kind == "CorrectnessTest":
+    summary = [project_name + ": " + result for project_name, result in results.items() if result]
+    if len(summary) == 0:
+        print("Summary: OK")
+    else:
+        print("Summary: Fail")
+        for s in summary:
+            print("    " + s)
+elif kind == "MemTraffic":
+    for project_name, traffic in results.items():
+        print("{0}: {1}".format(project_name, "failed" if traffic is None else "{0} MB".format(traffic)))
+else:
+    for project_name, output_paths in results.items():
+        for output_path in output_paths:
+            print(output_path)
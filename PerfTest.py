@@ -1,54 +1,82 @@
 ﻿import common
 
-from os import path, chdir, makedirs
-from subprocess import Popen, PIPE
+from os import path, makedirs
 import subprocess
 import json
 import time
 import sys
 import platform
 import uuid
-import shutil
-
-def invoke(args):
-    process = Popen(args, stdout=PIPE, text=True)
-    out, err = process.communicate()
-    exit_code = process.wait()
-    if err:
-        print("Error:")
-        print(err)
-        return False
-    return exit_code
+import random
+
+import cache_state
+import stats
+import storage
+
+def invoke(cmd_line_args, cores=None):
+    return common.run_and_trace(cmd_line_args, args.sample_interval if args.sample_interval > 0 else None, cores=cores)
+
 
+def cache_state_mode(indexing):
+    if args.cache_state == "keep" and indexing:
+        return "cold"
+    return args.cache_state
 
-def run_inspect_code(project_dir, sln_file, project_to_check, msbuild_props, indexing):
-    args, report_file = common.inspect_code_run_arguments(project_dir, sln_file, project_to_check, msbuild_props)
-    args.insert(0, common.inspect_code_path)
+
+def run_inspect_code(project_dir, sln_file, project_to_check, msbuild_props, indexing, jobs=None, cores=None):
+    inspect_code_args, report_file = common.inspect_code_run_arguments(project_dir, sln_file, project_to_check, msbuild_props)
+    inspect_code_args.insert(0, common.inspect_code_path)
     if indexing:
-        args.append('--exclude="**"')
-    #print(subprocess.list2cmdline(args))
-    assert(invoke(args) == (1 if indexing else 0))
+        inspect_code_args.append('--exclude="**"')
+    if jobs:
+        inspect_code_args.append("-j={0}".format(jobs))
+    #print(subprocess.list2cmdline(inspect_code_args))
+    status, warmup_timeline = invoke(inspect_code_args, cores)
+    common.check_status(status, 1 if indexing else 0)
     result = []
+    timelines = []
+    statuses = []
 
-    for attempt in range(10):
-        print("attempt {0}".format(attempt))
-        if indexing:
-            shutil.rmtree(common.caches_home)
-        start = time.time()
-        assert(invoke(args) == (1 if indexing else 0))
-        end = time.time()
-        print("Elapsed time: " + common.duration(start, end))
-        result.append(end - start)
-    
-    return result
+    mode = cache_state_mode(indexing)
+    if mode == "warm":
+        caches_snapshot = cache_state.snapshot(common.caches_home)
+        storage.touch(common.cli_test_dir, caches_snapshot, "caches snapshot")
+    elif mode == "incremental":
+        files_to_change = cache_state.inspected_files(warmup_timeline, sln_file)
 
+    # appended lines are truncated after the attempts, so the sources stay as checked out
+    original_sizes = {}
+    attempt = 0
+    try:
+        while not enough_attempts(result):
+            print("attempt {0}".format(attempt))
+            attempt += 1
+            if mode == "cold":
+                cache_state.move_aside(common.caches_home)
+            elif mode == "warm":
+                cache_state.restore(caches_snapshot, common.caches_home)
+            elif mode == "incremental":
+                cache_state.touch_files(files_to_change, args.changed_files, args.change, attempt, original_sizes)
+            status, timeline = invoke(inspect_code_args, cores)
+            common.check_status(status, 1 if indexing else 0)
+            # a retried attempt is timed by its last run only
+            print("Elapsed time: " + common.duration(0, status.elapsed))
+            result.append(status.elapsed)
+            timelines.append(timeline)
+            statuses.append(status.to_json())
+    finally:
+        cache_state.truncate_files(original_sizes)
 
-def measure_project(project_name, project, indexing, cmake_generator):
-    project_dir, sln_file = common.prepare_project(project_name, project, cmake_generator)
+    if mode == "warm":
+        cache_state.move_aside(caches_snapshot)
+    cache_state.wait_for_reclaim()
+    return result, timelines, statuses
 
+
+def measure_project(project, indexing, project_dir, sln_file, jobs=None, cores=None):
     project_to_check = project.get("project to check")
     msbuild_props = project.get("msbuild properties")
-    return run_inspect_code(project_dir, sln_file, project_to_check, msbuild_props, indexing)
+    return run_inspect_code(project_dir, sln_file, project_to_check, msbuild_props, indexing, jobs, cores)
 
     
 def get_environment():
@@ -64,79 +92,307 @@ def get_environment():
 common.argparser.add_argument("--human-readable", dest="human_readable", action='store_true')
 common.argparser.add_argument("--out-dir", dest="out_dir")
 common.argparser.add_argument("--indexing", dest="indexing", action='store_true')
+common.argparser.add_argument("--file-gaps", dest="file_gaps", type=int, default=0,
+                              help="store the given count of the largest gaps between \"Inspecting\" lines; "
+                                   "they are per-file durations only with -j=1 (see --jobs-sweep)")
+common.argparser.add_argument("--sample-interval", dest="sample_interval", type=float, default=0.5,
+                              help="interval in seconds of resource usage sampling, 0 disables sampling")
+common.argparser.add_argument("--cache-state", dest="cache_state", choices=["keep", "cold", "warm", "incremental"], default="keep",
+                              help="state of caches-home before every attempt; --indexing implies 'cold' unless specified; "
+                                   "A/B comparisons support only 'keep' and 'cold'")
+common.argparser.add_argument("--changed-files", dest="changed_files", type=int, default=10,
+                              help="count of inspected files changed before every attempt in the 'incremental' mode")
+common.argparser.add_argument("--change", dest="change", choices=["touch", "append"], default="touch")
+common.argparser.add_argument("--attempts", dest="attempts", type=int, default=10)
+common.argparser.add_argument("--adaptive", dest="adaptive", action='store_true',
+                              help="stop as soon as the confidence interval of the median is narrow enough")
+common.argparser.add_argument("--ci-width", dest="ci_width", type=float, default=2.0,
+                              help="target width of the confidence interval in percents of the median")
+common.argparser.add_argument("--min-attempts", dest="min_attempts", type=int, default=4)
+common.argparser.add_argument("--max-attempts", dest="max_attempts", type=int, default=20)
+common.argparser.add_argument("--baseline", dest="baseline", help="build directory of the baseline inspectcode for A/B comparison")
+common.argparser.add_argument("--candidate", dest="candidate", help="build directory of the candidate inspectcode for A/B comparison")
+common.argparser.add_argument("--ab-order", dest="ab_order", choices=["abab", "random"], default="random",
+                              help="order of attempts inside every baseline/candidate pair")
+common.argparser.add_argument("--ab-seed", dest="ab_seed", type=int, default=0)
+common.argparser.add_argument("--jobs-sweep", dest="jobs_sweep",
+                              help="comma separated inspectcode -j values to measure every project with, "
+                                   "or 'auto' for powers of two up to the count of available cores")
+common.argparser.add_argument("--pin-cores", dest="pin_cores", action='store_true',
+                              help="run -j=N attempts of the sweep on N available cores only, one per physical core "
+                                   "while there are enough of them (on Linux; elsewhere the first N logical cores, "
+                                   "which may be SMT siblings)")
+common.argparser.set_defaults(adaptive=False)
+common.argparser.set_defaults(pin_cores=False)
 common.argparser.set_defaults(human_readable=False)
 common.argparser.set_defaults(indexing=False)
 args = common.argparser.parse_args()
+common.apply_run_limits(args)
+if args.candidate and not args.baseline:
+    args.baseline = common.resharper_build
+if args.candidate and args.cache_state in ["warm", "incremental"]:
+    # only cold caches are prepared separately for each side of the comparison
+    sys.exit("--cache-state {0} is not supported in A/B comparisons".format(args.cache_state))
+
+
+def sweep_jobs_values(spec):
+    available = len(common.process_affinity())
+    if spec == "auto":
+        values = []
+        jobs = 1
+        while jobs < available:
+            values.append(jobs)
+            jobs *= 2
+        return values + [available]
+    values = sorted(set(int(value) for value in spec.split(",")))
+    if values[0] < 1:
+        sys.exit("-j values of the sweep must be positive")
+    if args.pin_cores and values[-1] > available:
+        sys.exit("can't pin -j={0} to {1} available cores".format(values[-1], available))
+    return values
+
+
+jobs_values = sweep_jobs_values(args.jobs_sweep) if args.jobs_sweep else None
+
+
+def enough_attempts(result, absolute=False):
+    if not args.adaptive:
+        return len(result) >= args.attempts
+    if len(result) < args.min_attempts:
+        return False
+    if len(result) >= args.max_attempts:
+        return True
+    if absolute:
+        # the values are already relative differences in percents
+        low, high = stats.bootstrap_ci(result)
+        return high - low < args.ci_width
+    steady = result[stats.warmup_count(result):]
+    return len(steady) >= 2 and stats.relative_ci_width(steady) < args.ci_width
 
 
 def is_suitable_for_perf_test(project):
-    return args.human_readable or not ("required dependencies" in project)
+    # dependencies are installed once and pinned by the vcpkg commit, so they don't affect the measurements
+    return args.human_readable or not ("required dependencies" in project) or "vcpkg" in common.env
+
+
+def store_result(project_name, project, cmake_generator, to_store):
+    to_store["project"] = project_name
+    to_store["cache state"] = cache_state_mode(args.indexing)
+    to_store["indexing"] = args.indexing
+    to_store["environment"] = get_environment()
+    project_sources = project["sources"].copy()
+    project_sources.pop("root", None)
+    project_sources.pop("kind", None)
+    to_store["project sources"] = project_sources
+
+    if cmake_generator:
+        gen_name, gen_value = cmake_generator
+        to_store["cmake generator"] = gen_name
+
+    output_dir = args.out_dir
+    if not path.isabs(output_dir):
+        output_dir = path.join(common.cli_test_dir, output_dir)
+    output_dir = path.join(output_dir, project_name)
+    makedirs(output_dir, exist_ok=True)
+    output_path = path.join(output_dir, str(uuid.uuid4()) + ".json")
+    print(output_path)
+    with open(output_path, "w") as output:
+        json.dump(to_store, output, indent=4)
+    return output_path
 
 
-def process_project_with_cmake_generator(project_name, project, cmake_generator):
-    result = measure_project(project_name, project, args.indexing, cmake_generator)
+def process_project_with_cmake_generator(project_name, project, cmake_generator, project_dir, sln_file):
+    if args.candidate:
+        return process_project_ab(project_name, project, cmake_generator, project_dir, sln_file)
+    if jobs_values:
+        return process_project_sweep(project_name, project, cmake_generator, project_dir, sln_file)
+
+    result, timelines, statuses = measure_project(project, args.indexing, project_dir, sln_file)
     if args.human_readable:
         print(result)
     else:
         to_store = {}
         to_store["inspect-code results"] = result
-        to_store["project"] = project_name
-        to_store["environment"] = get_environment()
-        project_sources = project["sources"].copy()
-        project_sources.pop("root", None)
-        project_sources.pop("kind", None)
-        to_store["project sources"] = project_sources
-
-        if cmake_generator:
-            gen_name, gen_value = cmake_generator
-            to_store["cmake generator"] = gen_name
-
-        output_dir = args.out_dir
-        if not path.isabs(output_dir):
-            output_dir = path.join(common.cli_test_dir, output_dir)
-        output_dir = path.join(output_dir, project_name)
-        makedirs(output_dir, exist_ok=True)
-        output_path = path.join(output_dir, str(uuid.uuid4()) + ".json")
-        print(output_path)
-        with open(output_path, "w") as output:
-            json.dump(to_store, output, indent=4)
-
-
-def process_project(project_name, project):
-    if "custom build tool" in project:
-        process_project_with_cmake_generator(project_name, project, None)
-        return
-
-    supported_generators = common.env["VS CMake Generators"]
-    project_generators = project.get("cmake generators")
-
-    if project_generators:
-        for generator in project_generators:
-            process_project_with_cmake_generator(project_name, project, (generator, supported_generators[generator]))
-    else:
-        for cmake_generator in supported_generators.items():
-            process_project_with_cmake_generator(project_name, project, cmake_generator)
-
-
-project_name = args.project
-if project_name:
-    project = common.projects[project_name]
-    project = common.read_conf_if_needed(project)
-    if not is_suitable_for_perf_test(project):
-        sys.exit("We are not ready yet to compare time perfomance results for projects with external dependecies")
-    process_project(project_name, project)
-else:
-    items = list(common.projects.items())
-    #items.reverse()
-    start_time = time.time()
-
-    for project_name, project in items:
+        to_store["statistics"] = stats.summary(result)
+        to_store["phase durations"] = [timeline.phase_durations() for timeline in timelines]
+        if args.file_gaps:
+            to_store["largest file gaps"] = [timeline.largest_file_gaps(args.file_gaps) for timeline in timelines]
+        to_store["resources"] = [timeline.resources for timeline in timelines]
+        to_store["run statuses"] = statuses
+        return store_result(project_name, project, cmake_generator, to_store)
+
+
+def ab_arguments(build_dir, side, inspect_code_args):
+    # every build gets its own caches-home, otherwise each switch would invalidate caches of the other one
+    result = [path.join(build_dir, common.inspect_code_exe)]
+    for arg in inspect_code_args:
+        if arg.startswith("--caches-home="):
+            arg = "--caches-home={0}-{1}".format(common.caches_home, side)
+        result.append(arg)
+    return result
+
+
+def run_ab(project, project_dir, sln_file, indexing):
+    inspect_code_args, _ = common.inspect_code_run_arguments(project_dir, sln_file, project.get("project to check"), project.get("msbuild properties"))
+    if indexing:
+        inspect_code_args.append('--exclude="**"')
+    expected_exit_code = 1 if indexing else 0
+    sides = {
+        "baseline": ab_arguments(args.baseline, "baseline", inspect_code_args),
+        "candidate": ab_arguments(args.candidate, "candidate", inspect_code_args),
+    }
+    for side, side_args in sides.items():
+        storage.touch(common.cli_test_dir, "{0}-{1}".format(common.caches_home, side), "caches")
+        print("warmup of {0}".format(side))
+        status, _ = invoke(side_args)
+        common.check_status(status, expected_exit_code)
+
+    rng = random.Random(args.ab_seed)
+    result = {"baseline": [], "candidate": [], "order": [], "relative differences": [], "run statuses": []}
+    while not enough_attempts(result["relative differences"], absolute=True):
+        pair = ["baseline", "candidate"]
+        if args.ab_order == "random":
+            rng.shuffle(pair)
+        times = {}
+        statuses = {}
+        for side in pair:
+            print("attempt {0} of {1}".format(len(result["order"]), side))
+            if cache_state_mode(indexing) == "cold":
+                cache_state.move_aside("{0}-{1}".format(common.caches_home, side))
+            status, _ = invoke(sides[side])
+            common.check_status(status, expected_exit_code)
+            times[side] = status.elapsed
+            statuses[side] = status.to_json()
+            print("Elapsed time: " + common.duration(0, times[side]))
+        result["order"].append("".join(side[0].upper() for side in pair))
+        result["baseline"].append(times["baseline"])
+        result["candidate"].append(times["candidate"])
+        result["run statuses"].append(statuses)
+        result["relative differences"].append((times["candidate"] - times["baseline"]) / times["baseline"] * 100)
+
+    cache_state.wait_for_reclaim()
+    differences = result["relative differences"]
+    result["median difference"] = stats.median(differences)
+    result["ci"] = list(stats.bootstrap_ci(differences))
+    return result
+
+
+def process_project_ab(project_name, project, cmake_generator, project_dir, sln_file):
+    result = run_ab(project, project_dir, sln_file, args.indexing)
+    low, high = result["ci"]
+    print("candidate vs baseline: {0:+.2f}% (95% CI {1:+.2f}% .. {2:+.2f}%)".format(result["median difference"], low, high), flush=True)
+    if not args.human_readable:
+        result["baseline build"] = args.baseline
+        result["candidate build"] = args.candidate
+        return store_result(project_name, project, cmake_generator, {"ab results": result})
+
+
+def cpu_utilization(elapsed, timeline):
+    # average count of busy cores during the attempt
+    if not timeline.resources or not elapsed:
+        return None
+    return (timeline.resources["user time"] + timeline.resources["system time"]) / elapsed
+
+
+def run_jobs_sweep(project, project_dir, sln_file):
+    available = common.physical_core_order(common.process_affinity())
+    points = []
+    for jobs in jobs_values:
+        print("-j={0}".format(jobs), flush=True)
+        # only inspectcode is pinned, the harness threads (sampler, reclaimer of moved aside caches) stay unpinned
+        cores = available[:jobs] if args.pin_cores else None
+        result, timelines, statuses = measure_project(project, args.indexing, project_dir, sln_file, jobs, cores)
+        points.append({
+            "jobs": jobs,
+            "pinned cores": cores,
+            "inspect-code results": result,
+            "statistics": stats.summary(result),
+            "cpu utilization": [cpu_utilization(elapsed, timeline) for elapsed, timeline in zip(result, timelines)],
+            "phase durations": [timeline.phase_durations() for timeline in timelines],
+            "resources": [timeline.resources for timeline in timelines],
+            "run statuses": statuses,
+        })
+
+    # speedup and efficiency are relative to the smallest -j of the sweep
+    base = points[0]
+    base_median = stats.median(base["inspect-code results"])
+    for point in points:
+        utilization = [value for value in point["cpu utilization"] if value is not None]
+        point["median cpu utilization"] = stats.median(utilization) if utilization else None
+        point["speedup"] = base_median / stats.median(point["inspect-code results"])
+        point["efficiency"] = point["speedup"] * base["jobs"] / point["jobs"]
+    return points
+
+
+def print_sweep(points):
+    print("{0:>5} {1:>12} {2:>8} {3:>10} {4:>10}".format("-j", "median, s", "speedup", "efficiency", "busy cores"))
+    for point in points:
+        utilization = point["median cpu utilization"]
+        print("{0:>5} {1:>12.2f} {2:>8.2f} {3:>10.2f} {4:>10}".format(
+            point["jobs"], stats.median(point["inspect-code results"]), point["speedup"], point["efficiency"],
+            "-" if utilization is None else "{0:.2f}".format(utilization)), flush=True)
+
+
+def process_project_sweep(project_name, project, cmake_generator, project_dir, sln_file):
+    points = run_jobs_sweep(project, project_dir, sln_file)
+    print_sweep(points)
+    if not args.human_readable:
+        return store_result(project_name, project, cmake_generator, {"jobs sweep": points})
+
+
+def work_items(project_name, project):
+    return [(project_name, project, cmake_generator) for cmake_generator in common.cmake_generators(project)]
+
+
+if __name__ == "__main__":
+    project_name = args.project
+    if project_name:
+        project = common.projects[project_name]
         project = common.read_conf_if_needed(project)
         if not is_suitable_for_perf_test(project):
-            continue
-        print("processing project {0}...".format(project_name), flush=True)
-        process_project(project_name, project)
-        print('-------------------------------------------------------', flush=True)
+            sys.exit("We are not ready yet to compare time perfomance results for projects with external dependecies")
+        common.install_dependencies([(project_name, project)])
+        for item in common.prepare_ahead(work_items(project_name, project)):
+            process_project_with_cmake_generator(*item)
+    else:
+        items = common.selected_projects(args, "PerfTest", is_suitable_for_perf_test)
+        #items.reverse()
+        start_time = time.time()
 
-    print("Total time: " + common.duration(start_time, time.time()))
-    
+        all_work_items = []
+        for project_name, project in items:
+            all_work_items.extend(work_items(project_name, project))
+        output_paths = {}
+        failures = []
+        common.install_dependencies(items)
+
+        current_project = None
+        for item in common.prepare_ahead(all_work_items):
+            project_name = item[0]
+            if project_name != current_project:
+                if current_project:
+                    print('-------------------------------------------------------', flush=True)
+                print("processing project {0}...".format(project_name), flush=True)
+                current_project = project_name
+            try:
+                start = time.time()
+                output_path = process_project_with_cmake_generator(*item)
+                common.record_duration("PerfTest", project_name, item[2], time.time() - start)
+            except common.InspectCodeFailure as failure:
+                # one broken project shouldn't cost the results of the others
+                print("Error: " + str(failure), flush=True)
+                failures.append("{0}: {1}".format(project_name, failure))
+                cache_state.wait_for_reclaim()
+                continue
+            if output_path:
+                output_paths.setdefault(project_name, []).append(output_path)
+        if current_project:
+            print('-------------------------------------------------------', flush=True)
+        if args.summary_file:
+            common.write_summary(args.summary_file, "PerfTest", output_paths)
+
+        print("Total time: " + common.duration(start_time, time.time()))
+        if failures:
+            print("Failures:")
+            for failure in failures:
+                print("    " + failure)
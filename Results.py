@@ -0,0 +1,130 @@
+from argparse import ArgumentParser
+from os import path
+import json
+import os
+import sqlite3
+
+import common
+import stats
+
+schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    file TEXT UNIQUE NOT NULL,
+    project TEXT NOT NULL,
+    generator TEXT NOT NULL,
+    version TEXT NOT NULL,
+    computer TEXT NOT NULL,
+    cache_state TEXT NOT NULL,
+    indexing INTEGER NOT NULL,
+    results TEXT NOT NULL,
+    median REAL
+);
+CREATE INDEX IF NOT EXISTS runs_key ON runs (project, generator, cache_state, indexing, version, computer);
+CREATE INDEX IF NOT EXISTS runs_version ON runs (version, computer);
+"""
+
+
+def resolve_dir(directory):
+    if not path.isabs(directory):
+        directory = path.join(common.cli_test_dir, directory)
+    return directory
+
+
+def open_store(store_path):
+    connection = sqlite3.connect(store_path)
+    connection.executescript(schema)
+    return connection
+
+
+def iter_result_files(out_dir):
+    for project_entry in os.scandir(out_dir):
+        if not project_entry.is_dir():
+            continue
+        for entry in os.scandir(project_entry.path):
+            if entry.name.endswith(".json") and entry.is_file():
+                yield entry.path
+
+
+def ingest(connection, out_dir):
+    known_files = set(row[0] for row in connection.execute("SELECT file FROM runs"))
+    added = 0
+    for file in iter_result_files(out_dir):
+        relative = path.relpath(file, out_dir)
+        if relative in known_files:
+            continue
+        with open(file) as f:
+            run = json.load(f)
+        if "inspect-code results" not in run:
+            # A/B comparisons and -j sweeps have no single series of attempts
+            continue
+        results = run["inspect-code results"]
+        environment = run.get("environment", {})
+        connection.execute("INSERT INTO runs (file, project, generator, version, computer, cache_state, indexing, results, median) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           (relative, run["project"], run.get("cmake generator", ""),
+                            environment.get("inspect code version", ""), environment.get("computer name", ""),
+                            run.get("cache state", "keep"), int(run.get("indexing", False)),
+                            json.dumps(results), stats.median(results) if results else None))
+        added += 1
+    connection.commit()
+    return added
+
+
+def attempts_by_key(connection, version, computer, project):
+    # runs of different cache states and of indexing differ by far more than a regression
+    query = "SELECT project, generator, cache_state, indexing, results FROM runs WHERE version = ?"
+    parameters = [version]
+    if computer:
+        query += " AND computer = ?"
+        parameters.append(computer)
+    if project:
+        query += " AND project = ?"
+        parameters.append(project)
+    result = {}
+    for project_name, generator, cache_state, indexing, results in connection.execute(query, parameters):
+        result.setdefault((project_name, generator, cache_state, bool(indexing)), []).extend(json.loads(results))
+    return result
+
+
+def compare(connection, base_version, new_version, computer, project, alpha, threshold):
+    base = attempts_by_key(connection, base_version, computer, project)
+    new = attempts_by_key(connection, new_version, computer, project)
+    regressions = []
+    for key in sorted(base.keys() & new.keys()):
+        base_attempts, new_attempts = base[key], new[key]
+        base_median, new_median = stats.median(base_attempts), stats.median(new_attempts)
+        relative_delta = (new_median - base_median) / base_median * 100
+        p_value = stats.mann_whitney(base_attempts, new_attempts)
+        if relative_delta > threshold and p_value < alpha:
+            regressions.append((key, base_median, new_median, relative_delta, p_value))
+    return regressions
+
+
+argparser = ArgumentParser(description="indexed store of PerfTest results")
+argparser.add_argument("--store", dest="store", default="results.sqlite")
+subparsers = argparser.add_subparsers(dest="command", required=True)
+ingest_parser = subparsers.add_parser("ingest")
+ingest_parser.add_argument("--out-dir", dest="out_dir", required=True)
+compare_parser = subparsers.add_parser("compare")
+compare_parser.add_argument("base")
+compare_parser.add_argument("new")
+compare_parser.add_argument("--computer", dest="computer")
+compare_parser.add_argument("-p", "--project", dest="project")
+compare_parser.add_argument("--alpha", dest="alpha", type=float, default=0.01)
+compare_parser.add_argument("--threshold", dest="threshold", type=float, default=1.0,
+                            help="minimal regression of the median in percents")
+
+if __name__ == "__main__":
+    args = argparser.parse_args()
+    connection = open_store(resolve_dir(args.store))
+    if args.command == "ingest":
+        print("{0} new results ingested".format(ingest(connection, resolve_dir(args.out_dir))))
+    else:
+        regressions = compare(connection, args.base, args.new, args.computer, args.project, args.alpha, args.threshold)
+        for (project_name, generator, cache_state, indexing), base_median, new_median, relative_delta, p_value in regressions:
+            name = project_name + (" (" + generator + ")" if generator else "")
+            name += " [{0}{1}]".format(cache_state, ", indexing" if indexing else "")
+            print("{0}: {1:.1f}s -> {2:.1f}s; delta = {3:.2f}%, p = {4:.4f}".format(name, base_median, new_median, relative_delta, p_value))
+        if not regressions:
+            print("No significant regressions")
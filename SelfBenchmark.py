@@ -0,0 +1,107 @@
+from argparse import ArgumentParser
+from os import path, makedirs
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import common
+import report
+import stats
+
+# Measures the overhead the harness adds around inspectcode, using fake_inspectcode.py instead of the real one,
+# so it runs on any box with python and git.
+
+fake_inspect_code = path.join(path.dirname(path.abspath(__file__)), "fake_inspectcode.py")
+
+
+def measure(action, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - start)
+    return stats.median(timings)
+
+
+def create_fake_project(work_dir):
+    repo_dir = path.join(work_dir, "fake-origin")
+    makedirs(repo_dir)
+    with open(path.join(repo_dir, "fake.sln"), "w") as f:
+        f.write("Microsoft Visual Studio Solution File, Format Version 12.00\n")
+    subprocess.run(["git", "init", "-q"], cwd=repo_dir, check=True)
+    subprocess.run(["git", "add", "."], cwd=repo_dir, check=True)
+    subprocess.run(["git", "-c", "user.name=fake", "-c", "user.email=fake@localhost", "commit", "-q", "-m", "fake"],
+                   cwd=repo_dir, check=True)
+    subprocess.run(["git", "config", "uploadpack.allowAnySHA1InWant", "true"], cwd=repo_dir, check=True)
+    commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_dir, check=True, stdout=subprocess.PIPE, text=True).stdout.strip()
+    return {
+        "sources": {"repo": "file://" + repo_dir.replace("\\", "/"), "commit": commit},
+        "custom build tool": {"path to .sln": "fake.sln"},
+    }
+
+
+def run_benchmark(args, work_dir):
+    # nothing may be written to the real test directory
+    common.cli_test_dir = work_dir
+    common.projects_dir = path.join(work_dir, "projects")
+    common.caches_home = path.join(work_dir, "caches-home")
+    common.git_object_store = path.join(work_dir, "git-objects")
+    common.downloads_dir = path.join(work_dir, "downloads")
+    project = create_fake_project(work_dir)
+    results = {}
+
+    common.prepare_project("fake", project, None)
+    results["prepare project (no-op)"] = measure(lambda: common.prepare_project("fake", project, None), args.repeat)
+
+    report_file = path.join(work_dir, "resharper-report.xml")
+    fake_args = [sys.executable, fake_inspect_code, "--fake-files={0}".format(args.files), "--fake-issues={0}".format(args.issues),
+                 "--fake-duration={0}".format(args.duration), "-o=" + report_file]
+    results["fake inspectcode (no capture)"] = measure(lambda: subprocess.run(fake_args, stdout=subprocess.DEVNULL), args.repeat)
+    results["fake inspectcode (traced)"] = measure(lambda: common.run_and_trace(fake_args), args.repeat)
+    results["fake inspectcode (traced and sampled)"] = measure(lambda: common.run_and_trace(fake_args, 0.5), args.repeat)
+    results["output capture"] = results["fake inspectcode (traced)"] - results["fake inspectcode (no capture)"]
+    results["resource sampling"] = results["fake inspectcode (traced and sampled)"] - results["fake inspectcode (traced)"]
+
+    _, timeline = common.run_and_trace(fake_args)
+    output = timeline.output()
+    results["count_substring"] = measure(lambda: common.inspected_files_count(output), args.repeat)
+    results["report parsing"] = measure(lambda: report.read_report(report_file), args.repeat)
+
+    to_store = {
+        "inspect-code results": [args.duration] * 10,
+        "phase durations": [timeline.phase_durations()] * 10,
+        "largest file gaps": [timeline.largest_file_gaps(10)] * 10,
+    }
+    output_path = path.join(work_dir, "result.json")
+
+    def write_json():
+        with open(output_path, "w") as f:
+            json.dump(to_store, f, indent=4)
+
+    results["json writing"] = measure(write_json, args.repeat)
+    return results
+
+
+argparser = ArgumentParser(description="measure the overhead of the harness with a fake inspectcode")
+argparser.add_argument("--files", dest="files", type=int, default=600)
+argparser.add_argument("--issues", dest="issues", type=int, default=1000)
+argparser.add_argument("--duration", dest="duration", type=float, default=0.0,
+                       help="seconds the fake inspectcode spends on its work")
+argparser.add_argument("--repeat", dest="repeat", type=int, default=10)
+argparser.add_argument("--json", dest="json", action='store_true')
+
+if __name__ == "__main__":
+    args = argparser.parse_args()
+    work_dir = tempfile.mkdtemp(prefix="rscpp-self-benchmark-")
+    try:
+        results = run_benchmark(args, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        for stage, seconds in results.items():
+            print("{0:40} {1:10.3f} ms".format(stage, seconds * 1000))
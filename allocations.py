@@ -0,0 +1,72 @@
+import json
+import re
+
+import stats
+
+# Lines of the dumper's breakdown files are expected to contain an allocated byte count and a name (type or
+# call stack) in either order, separated by a tab, a semicolon or a run of spaces. Lines without both are skipped.
+count_pattern = re.compile(r"^\d+$")
+separator_pattern = re.compile(r"\t|;|\s{2,}")
+
+
+def parse_breakdown(file_path):
+    totals = {}
+    with open(file_path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            fields = [field.strip() for field in separator_pattern.split(line.strip()) if field.strip()]
+            counts = [field for field in fields if count_pattern.match(field)]
+            names = [field for field in fields if not count_pattern.match(field)]
+            if not counts or not names:
+                continue
+            name = " <- ".join(names)
+            totals[name] = totals.get(name, 0) + int(counts[0])
+    return totals
+
+
+def compact(totals, limit):
+    # the tail is folded into one entry, so the baseline stays small even for huge snapshots
+    top = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    result = dict(top[:limit])
+    rest = sum(count for _, count in top[limit:])
+    if rest:
+        result["<other>"] = rest
+    return result
+
+
+def top_growth(baseline, current, count):
+    names = set(baseline) | set(current)
+    deltas = [(name, current.get(name, 0) - baseline.get(name, 0)) for name in names if name != "<other>"]
+    deltas.sort(key=lambda item: abs(item[1]), reverse=True)
+    return [{"name": name, "baseline": baseline.get(name, 0), "current": current.get(name, 0), "delta": delta}
+            for name, delta in deltas[:count]]
+
+
+def load_json(file_path, default):
+    try:
+        with open(file_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(file_path, value):
+    with open(file_path, "w") as f:
+        json.dump(value, f, indent=4)
+
+
+def tolerance(history, expected_traffic, min_samples=5, sigmas=3.0):
+    # relative tolerance in percents: the historical fixed thresholds, widened for projects whose recent
+    # measurements spread more than that; the spread of integer MB values is often 0, so it never narrows them
+    default = 3.0 if expected_traffic < 1000 else 0.5
+    if len(history) < min_samples:
+        return default
+    spread = stats.mad(history) * stats.mad_scale / stats.median(history) * 100
+    return max(sigmas * spread, default)
+
+
+def print_growth(kind, growth):
+    if not growth:
+        return
+    print("top {0} changes:".format(kind))
+    for entry in growth:
+        print("    {0:+10.1f} MB  {1}".format(entry["delta"] / (1 << 20), entry["name"]))
@@ -0,0 +1,84 @@
+from os import path
+import glob
+import os
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import uuid
+
+reclaimers = []
+
+
+def move_aside(directory):
+    # renaming is cheap, the actual deletion happens in background while the next attempt is measured
+    if not path.exists(directory):
+        return
+    trash = "{0}.trash-{1}".format(directory, uuid.uuid4().hex)
+    os.rename(directory, trash)
+    reclaimer = threading.Thread(target=shutil.rmtree, args=(trash, True), daemon=True)
+    reclaimer.start()
+    reclaimers.append(reclaimer)
+
+
+def remove_leftovers(directory):
+    # trash of `directory` and of its siblings (e.g. A/B caches) left by interrupted runs
+    for trash in glob.glob(glob.escape(directory) + "*.trash-*"):
+        shutil.rmtree(trash, ignore_errors=True)
+
+
+def wait_for_reclaim():
+    while reclaimers:
+        reclaimers.pop().join()
+
+
+def copy_tree(source, target):
+    # Hardlinks are not an option: inspectcode updates cache files in place, which would corrupt the snapshot.
+    if sys.platform.startswith("linux"):
+        if subprocess.run(["cp", "-a", "--reflink=always", source, target], stderr=subprocess.DEVNULL).returncode == 0:
+            return
+        if path.exists(target):
+            shutil.rmtree(target)
+    shutil.copytree(source, target)
+
+
+def snapshot(directory):
+    snapshot_dir = directory + ".snapshot"
+    move_aside(snapshot_dir)
+    copy_tree(directory, snapshot_dir)
+    return snapshot_dir
+
+
+def restore(snapshot_dir, directory):
+    move_aside(directory)
+    copy_tree(snapshot_dir, directory)
+
+
+def touch_files(files, count, mode, seed, original_sizes):
+    # sizes of the files before the first append are kept in `original_sizes` for truncate_files
+    chosen = random.Random(seed).sample(files, min(count, len(files)))
+    for file in chosen:
+        if mode == "append":
+            original_sizes.setdefault(file, path.getsize(file))
+            with open(file, "a") as f:
+                f.write("\n// modified by rscpp-command-line-test\n")
+        else:
+            os.utime(file)
+    return chosen
+
+
+def truncate_files(original_sizes):
+    for file, size in original_sizes.items():
+        os.truncate(file, size)
+    original_sizes.clear()
+
+
+def inspected_files(timeline, sln_file):
+    result = []
+    for file, _ in timeline.files:
+        if not path.isabs(file):
+            file = path.join(path.dirname(sln_file), file)
+        if path.isfile(file):
+            result.append(file)
+    return result
@@ -1,12 +1,20 @@
-from os import path, chdir, makedirs
+from os import path, makedirs
+from concurrent.futures import ProcessPoolExecutor
+import os
 from subprocess import Popen, PIPE
 import subprocess
 import xml.etree.ElementTree as ET
 import json
-import requests
-import io
+import hashlib
+import shutil
 from argparse import ArgumentParser
-from zipfile import ZipFile
+from functools import lru_cache
+
+import cache_state
+import git_sources
+import inspect_output
+import storage
+import zip_sources
 
 with open("environment.json") as f:
     env = json.load(f)
@@ -23,37 +31,14 @@ projects_dir = path.join(cli_test_dir, "projects")
 caches_home = env.get("caches home")
 if not caches_home:
     caches_home = path.join(cli_test_dir, "caches-home")
-
-
-def git_clone_if_needed(target_dir, url):
-    if not path.exists(path.join(target_dir, ".git")):
-        subprocess.run(["git", "clone", url, target_dir], check=True)
-
-
-def git_checkout_commit_and_overwrite_local_changes(commit):
-    subprocess.run(["git", "checkout", commit], check=True, stdout=PIPE, stderr=PIPE)
-    subprocess.run(["git", "reset", "--hard"],  check=True, stdout=PIPE, stderr=PIPE)
+git_object_store = env.get("git object store")
+if not git_object_store:
+    git_object_store = path.join(cli_test_dir, "git-objects")
+downloads_dir = path.join(cli_test_dir, "downloads")
 
 
 def get_sources_from_git(project_input, target_dir):
-    git_clone_if_needed(target_dir, project_input["repo"])
-
-    chdir(target_dir)
-    subrepo = project_input.get("subrepo")
-    if subrepo:
-        subrepo_dir = subrepo["path"]
-        git_clone_if_needed(subrepo_dir, subrepo["url"])
-        chdir(subrepo_dir)
-        git_checkout_commit_and_overwrite_local_changes(subrepo["commit"])
-        chdir(target_dir)
-
-    git_checkout_commit_and_overwrite_local_changes(project_input["commit"])
-
-    custom_update_source_script = project_input.get("custom update source script")
-    if custom_update_source_script:
-        subprocess.run(custom_update_source_script, check=True, stdout=PIPE, stderr=PIPE)
-
-    subprocess.run(["git", "submodule", "update", "--init"], check=True, stdout=PIPE, stderr=PIPE)
+    git_sources.get_sources(git_object_store, project_input, target_dir)
     root_dir = project_input.get("root")
     if root_dir:
         return path.join(target_dir, root_dir)
@@ -61,12 +46,7 @@ def get_sources_from_git(project_input, target_dir):
         return target_dir
 
 def get_sources_from_zip(project_input, target_dir):
-    root_dir = path.join(target_dir, project_input["root"])
-    if not path.exists(root_dir):
-        response = requests.get(project_input["url"])
-        with ZipFile(io.BytesIO(response.content)) as zipfile:
-            zipfile.extractall(path=target_dir)
-    return root_dir
+    return zip_sources.get_sources(downloads_dir, project_input, target_dir)
 
 def get_sources(project_input, target_dir):
     kind = project_input.get("kind")
@@ -78,6 +58,60 @@ def get_sources(project_input, target_dir):
         raise ValueError("Unknown source kind: {0}".format(kind))
 
 
+vcpkg_manifest = path.join(cli_test_dir, "vcpkg-installed.json")
+
+
+def vcpkg_commit(vcpkg_dir):
+    result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=vcpkg_dir, stdout=PIPE, stderr=PIPE, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def is_vcpkg_package_installed(vcpkg_dir, package, triplet):
+    name = package.split("[")[0].split(":")[0]
+    info_dir = path.join(vcpkg_dir, "installed", "vcpkg", "info")
+    prefix, suffix = name + "_", "_" + triplet + ".list"
+    try:
+        return any(f.startswith(prefix) and f.endswith(suffix) for f in os.listdir(info_dir))
+    except OSError:
+        return False
+
+
+def install_dependencies(project_items):
+    # All dependencies are installed with one vcpkg call per triplet; the manifest remembers what is installed
+    # for which vcpkg commit, so vcpkg isn't started at all when nothing has changed.
+    dependencies = sorted(set(d for _, project in project_items for d in project.get("required dependencies", [])))
+    if not dependencies:
+        return
+    vcpkg = env.get("vcpkg")
+    if not vcpkg:
+        raise Exception("projects have required dependencies {0}, but environment doesn't containt path to vcpkg".format(dependencies))
+    vcpkg_dir, triplet = vcpkg["path"], vcpkg["triplet"]
+    commit = vcpkg_commit(vcpkg_dir)
+    try:
+        with open(vcpkg_manifest) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    installed = manifest.get(triplet)
+    if installed and installed["vcpkg commit"] == commit and commit:
+        missing = [d for d in dependencies if d not in installed["packages"] or not is_vcpkg_package_installed(vcpkg_dir, d, triplet)]
+        if not missing:
+            return
+        packages = sorted(set(installed["packages"]) | set(dependencies))
+    else:
+        packages = dependencies
+
+    print("installing dependencies {0}...".format(" ".join(packages)), flush=True)
+    subprocess.run([path.join(vcpkg_dir, "vcpkg"), "install"] + packages + ["--triplet", triplet],
+                   cwd=vcpkg_dir, check=True, stdout=PIPE)
+    manifest[triplet] = {"vcpkg commit": commit, "packages": packages}
+    makedirs(cli_test_dir, exist_ok=True)
+    tmp_file = vcpkg_manifest + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_file, vcpkg_manifest)
+
+
 def invoke_cmake(build_dir, cmake_generator, cmake_options, required_dependencies):
     cmd_line_args = ["cmake", "..", "-G", cmake_generator["name"]]
     architecture = cmake_generator.get("architecture")
@@ -88,16 +122,14 @@ def invoke_cmake(build_dir, cmake_generator, cmake_options, required_dependencie
         vcpkg = env.get("vcpkg")
         if vcpkg:
             vcpkg_dir = vcpkg["path"]
-            chdir(vcpkg_dir)
-            subprocess.run(["vcpkg", "install"] + required_dependencies + ["--triplet", vcpkg["triplet"]], check=True, stdout=PIPE)
+            install_dependencies([(None, {"required dependencies": required_dependencies})])
             cmd_line_args.append("-DCMAKE_TOOLCHAIN_FILE={0}/scripts/buildsystems/vcpkg.cmake".format(vcpkg_dir))
         else:
             raise Exception("project has required dependencies {0}, but environment doesn't containt path to vcpkg".format(required_dependencies))
     if cmake_options:
         cmd_line_args.extend(cmake_options)
     makedirs(build_dir, exist_ok=True)
-    chdir(build_dir)
-    subprocess.run(cmd_line_args, check=True, stdout=PIPE)
+    subprocess.run(cmd_line_args, cwd=build_dir, check=True, stdout=PIPE)
     with open(path.join(build_dir, "CMakeCache.txt")) as cmake_cache:
         for line in cmake_cache.readlines():
             if line.startswith("CMAKE_PROJECT_NAME"):
@@ -108,6 +140,86 @@ def invoke_cmake(build_dir, cmake_generator, cmake_options, required_dependencie
                 return sln_file
     
 
+configure_manifest_name = "rscpp-configure.json"
+
+
+@lru_cache(maxsize=None)
+def toolchain_versions():
+    # Visual Studio generators pick the compiler from the installed instances, so an update of any of them
+    # (or of the compiler found in the environment) may change the configured tree.
+    versions = {}
+    vswhere = path.join(os.environ.get("ProgramFiles(x86)", r"C:\Program Files (x86)"), "Microsoft Visual Studio", "Installer", "vswhere.exe")
+    if path.exists(vswhere):
+        result = subprocess.run([vswhere, "-all", "-products", "*", "-format", "json"], stdout=PIPE, stderr=PIPE, text=True)
+        if result.returncode == 0:
+            versions["visual studio"] = sorted([instance.get("installationPath"), instance.get("installationVersion")]
+                                               for instance in json.loads(result.stdout or "[]"))
+    for variable in ["VisualStudioVersion", "VCToolsVersion"]:
+        if os.environ.get(variable):
+            versions[variable] = os.environ[variable]
+    compiler = shutil.which("cl")
+    if compiler:
+        versions["cl"] = [compiler, path.getmtime(compiler)]
+    return versions
+
+
+def configure_fingerprint(project, cmake_generator):
+    required_dependencies = project.get("required dependencies")
+    vcpkg = env.get("vcpkg") if required_dependencies else None
+    inputs = {
+        "sources": project["sources"],
+        "cmake generator": cmake_generator,
+        "cmake options": project.get("cmake options"),
+        "required dependencies": required_dependencies,
+        "build step": project.get("build step"),
+        "vcpkg": vcpkg,
+        "vcpkg commit": vcpkg_commit(vcpkg["path"]) if vcpkg else None,
+        "toolchain": toolchain_versions(),
+    }
+    cmake = shutil.which("cmake")
+    if cmake:
+        inputs["cmake"] = [cmake, path.getmtime(cmake)]
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def read_configured_sln_file(build_dir, fingerprint):
+    try:
+        with open(path.join(build_dir, configure_manifest_name)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("fingerprint") != fingerprint:
+        return None
+    sln_file = manifest.get("sln file")
+    if not sln_file or not path.exists(sln_file):
+        return None
+    return sln_file
+
+
+def write_configure_manifest(build_dir, fingerprint, sln_file):
+    with open(path.join(build_dir, configure_manifest_name), "w") as f:
+        json.dump({"fingerprint": fingerprint, "sln file": sln_file}, f, indent=4)
+
+
+def configure_project(project, project_dir, cmake_generator):
+    gen_name, gen_description = cmake_generator
+    build_dir = path.join(project_dir, project.get("build dir", "build") + "-" + gen_name)
+    fingerprint = configure_fingerprint(project, gen_description)
+    sln_file = read_configured_sln_file(build_dir, fingerprint)
+    if sln_file:
+        return build_dir, sln_file
+
+    manifest = path.join(build_dir, configure_manifest_name)
+    if path.exists(manifest):
+        os.remove(manifest)
+    sln_file = invoke_cmake(build_dir, gen_description, project.get("cmake options"), project.get("required dependencies"))
+    build_step = project.get("build step")
+    if build_step:
+        subprocess.run(build_step.split(), cwd=build_dir, check=True, stdout=PIPE)
+    write_configure_manifest(build_dir, fingerprint, sln_file)
+    return build_dir, sln_file
+
+
 proj_config_dir = path.abspath("proj-config")
 
 def read_conf_if_needed(project):
@@ -151,6 +263,38 @@ def inspected_files_count(inspect_code_output):
     return count_substring(inspect_code_output, "Inspecting ")
 
 
+run_limits = {
+    "timeout": env.get("inspect code timeout", 6 * 60 * 60),
+    "stall_timeout": env.get("inspect code stall timeout", 30 * 60),
+    "retries": env.get("inspect code retries", 1),
+}
+
+
+def apply_run_limits(args):
+    if args.timeout is not None:
+        run_limits["timeout"] = args.timeout or None
+    if args.stall_timeout is not None:
+        run_limits["stall_timeout"] = args.stall_timeout or None
+    if args.retries is not None:
+        run_limits["retries"] = args.retries
+
+
+class InspectCodeFailure(Exception):
+    def __init__(self, status):
+        super().__init__("inspectcode " + status.describe())
+        self.status = status
+
+
+def check_status(status, expected_exit_code=0):
+    if not status.succeeded(expected_exit_code):
+        raise InspectCodeFailure(status)
+
+
+def run_and_trace(args, sample_interval=None, **kwargs):
+    limits = dict(run_limits, **kwargs)
+    return inspect_output.run_and_trace(args, env.get("inspect code phase markers"), sample_interval, **limits)
+
+
 def add_entry(node, key, value):
     entry = ET.SubElement(node, "s:Boolean")
     entry.text = str(value)
@@ -175,39 +319,294 @@ def generate_settings(files_to_skip):
     return ET.ElementTree(root)
 
 
+def enforce_disk_budget(pinned_paths, in_progress=()):
+    # must not be called while inspectcode is timed: measuring sizes walks the artifacts
+    disk_budget = env.get("disk budget")
+    if disk_budget:
+        pinned_paths = list(pinned_paths)
+        if in_progress:
+            # preparation of the items in progress may not have registered them yet
+            pinned_paths += [git_object_store, downloads_dir]
+        cache_state.remove_leftovers(caches_home)
+        storage.enforce_budget(cli_test_dir, int(disk_budget * (1 << 30)), pinned_paths, in_progress=in_progress)
+
+
 def prepare_project(project_name, project, cmake_generator):
     target_dir = path.join(projects_dir, project_name)
+    if project["sources"].get("kind") == "zip":
+        storage.touch(cli_test_dir, downloads_dir, "downloads")
+        storage.touch(cli_test_dir, target_dir, "checkout", project_name)
+    else:
+        # checkouts borrow objects from the store, so they are evicted together with it
+        storage.touch(cli_test_dir, git_object_store, "git store")
+        storage.touch(cli_test_dir, target_dir, "checkout", project_name, [git_object_store])
+    storage.touch(cli_test_dir, caches_home, "caches")
     project_dir = get_sources(project["sources"], target_dir)
     custom_build_tool = project.get("custom build tool")
     if custom_build_tool:
         prepare_sln_script = custom_build_tool.get("script")
         if prepare_sln_script:
-            chdir(project_dir)
-            subprocess.run(prepare_sln_script, check=True, stdout=PIPE)
+            # the executable lookup doesn't take `cwd` into account on Windows
+            script = path.join(project_dir, prepare_sln_script[0])
+            subprocess.run([script] + prepare_sln_script[1:], cwd=project_dir, check=True, stdout=PIPE)
         build_step = custom_build_tool.get("build step")
         if build_step:
             for step in build_step:
-                subprocess.run(step.split(), check=True, stdout=PIPE)
+                subprocess.run(step.split(), cwd=project_dir, check=True, stdout=PIPE)
         sln_file = path.join(project_dir, custom_build_tool["path to .sln"])
         assert(path.exists(sln_file))
     else:
-        gen_name, gen_description = cmake_generator
-        build_dir = path.join(project_dir, project.get("build dir", "build") + "-" + gen_name)
-        project_dir = build_dir
-        sln_file = invoke_cmake(build_dir, gen_description, project.get("cmake options"), project.get("required dependencies"))
-        build_step = project.get("build step")
-        if build_step:
-            chdir(build_dir)
-            subprocess.run(build_step.split(), check=True, stdout=PIPE)
+        project_dir, sln_file = configure_project(project, project_dir, cmake_generator)
+        storage.touch(cli_test_dir, project_dir, "build", project_name)
 
     generate_settings(project.get("to skip")).write(sln_file + ".DotSettings")
     return project_dir, sln_file
 
 
+def cmake_generators(project):
+    if "custom build tool" in project:
+        return [None]
+
+    supported_generators = env["VS CMake Generators"]
+    project_generators = project.get("cmake generators")
+    if project_generators:
+        return [(generator, supported_generators[generator]) for generator in project_generators]
+    else:
+        return list(supported_generators.items())
+
+
+def process_affinity():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    try:
+        import psutil
+        return psutil.Process().cpu_affinity()
+    except ImportError:
+        return list(range(os.cpu_count()))
+
+
+def pin_process(pid, cores):
+    if not cores:
+        return
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(pid, cores)
+    else:
+        import psutil
+        psutil.Process(pid or None).cpu_affinity(cores)
+
+
+def physical_core_order(cores):
+    # SMT siblings share the execution units, so the first cores of the result are on distinct physical
+    # cores and their siblings follow. Without the Linux sysfs topology the order is kept as is.
+    groups = {}
+    for core in cores:
+        try:
+            with open("/sys/devices/system/cpu/cpu{0}/topology/thread_siblings_list".format(core)) as f:
+                siblings = f.read().strip()
+        except OSError:
+            return list(cores)
+        groups.setdefault(siblings, []).append(core)
+    result = []
+    rank = 0
+    while len(result) < len(cores):
+        result += [group[rank] for group in groups.values() if rank < len(group)]
+        rank += 1
+    return result
+
+
+def pin_to_preparation_cores():
+    pin_process(0, env.get("preparation cores"))
+
+
+def prepare_ahead(work_items, pinned_paths=()):
+    # Work items are (project name, project, cmake generator) tuples. Preparation runs in a separate
+    # process pool (pinned to "preparation cores" if they are specified), so while the caller measures
+    # the yielded item the next ones are already being cloned and configured. Items of the same project
+    # share the sources directory, so they are neither prepared concurrently nor prepared while an item
+    # of the project is being measured. `pinned_paths` are kept by the disk budget enforcement between
+    # the items, the caller may update them.
+    workers = env.get("preparation workers", 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=pin_to_preparation_cores) as executor:
+        items = list(work_items)
+        futures = {}
+        measured_project = None
+
+        def submit_next_items(first):
+            # items of a busy project wait for their turn, while the items of other projects may be
+            # started out of order; they are yielded in order anyway
+            busy = {measured_project}
+            for index in range(first, len(items)):
+                if len(futures) >= workers:
+                    break
+                project_name, project, cmake_generator = items[index]
+                if index not in futures and project_name not in busy:
+                    futures[index] = executor.submit(prepare_project, project_name, project, cmake_generator)
+                busy.add(project_name)
+
+        for current, item in enumerate(items):
+            submit_next_items(current)
+            if current not in futures:
+                # the window is taken by the items started out of order
+                futures[current] = executor.submit(prepare_project, *item)
+            project_dir, sln_file = futures.pop(current).result()
+            # the caller doesn't measure anything until the item is yielded
+            enforce_disk_budget([path.join(projects_dir, item[0])] + list(pinned_paths),
+                                [path.join(projects_dir, items[index][0]) for index in futures])
+            measured_project = item[0]
+            submit_next_items(current + 1)
+            yield item + (project_dir, sln_file)
+            measured_project = None
+
+
 def duration(start, end):
     minutes, seconds = divmod(end - start, 60)
     return "{:02}:{:02}".format(int(minutes), int(seconds))
 
 
+durations_file = path.join(cli_test_dir, "durations.json")
+
+
+def generator_name(cmake_generator):
+    return cmake_generator[0] if cmake_generator else ""
+
+
+def load_durations(kind, durations_path=None):
+    # {project name: {generator name: seconds}}
+    try:
+        with open(durations_path or durations_file) as f:
+            return json.load(f).get(kind, {})
+    except (OSError, ValueError):
+        return {}
+
+
+def record_duration(kind, project_name, cmake_generator, seconds):
+    makedirs(cli_test_dir, exist_ok=True)
+    # children of concurrent CorrectnessTest record their durations at the same time
+    with git_sources.locked(cli_test_dir, "rscpp-durations.lock"):
+        try:
+            with open(durations_file) as f:
+                all_durations = json.load(f)
+        except (OSError, ValueError):
+            all_durations = {}
+        project_durations = all_durations.setdefault(kind, {}).get(project_name)
+        if not isinstance(project_durations, dict):
+            project_durations = {}
+        project_durations[generator_name(cmake_generator)] = seconds
+        all_durations[kind][project_name] = project_durations
+        tmp_file = durations_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(all_durations, f, indent=4, sort_keys=True)
+        os.replace(tmp_file, durations_file)
+
+
+def estimated_costs(project_items, durations, generators=cmake_generators):
+    # A project costs the sum of its generators which are going to run. Recorded durations are used as is;
+    # for the other generators "mem traffic" (or "inspected files count") is converted to seconds with
+    # the median ratio observed on the generators which have both.
+    def proxy(project):
+        return project.get("mem traffic") or project.get("inspected files count") or 0
+
+    def recorded(project_name, cmake_generator):
+        project_durations = durations.get(project_name)
+        if not isinstance(project_durations, dict):
+            return None
+        return project_durations.get(generator_name(cmake_generator))
+
+    ratios = sorted(recorded(name, g) / proxy(project) for name, project in project_items for g in generators(project)
+                    if recorded(name, g) is not None and proxy(project))
+    ratio = ratios[len(ratios) // 2] if ratios else 1.0
+    costs = {}
+    for name, project in project_items:
+        seconds = [recorded(name, g) for g in generators(project)]
+        costs[name] = sum(proxy(project) * ratio if s is None else s for s in seconds)
+    return costs
+
+
+def parse_shard(shard):
+    index, count = shard.split("/")
+    index, count = int(index), int(count)
+    if not 1 <= index <= count:
+        raise ValueError("invalid shard {0}, expected i/N with 1 <= i <= N".format(shard))
+    return index, count
+
+
+def shard_key(name):
+    return hashlib.sha256(name.encode()).hexdigest()
+
+
+def partition(costs, count, drift=0.15):
+    # Every project has a home shard derived from the hash of its name, so shards keep their projects
+    # (and checkouts) while durations change. Projects are moved only while the heaviest shard exceeds
+    # the average by more than `drift`; candidates are taken in the order of their hashes, so the moves
+    # don't depend on small changes of the costs either. Generators of a project always stay together.
+    loads = [0.0] * count
+    shards = [[] for _ in range(count)]
+    for name in sorted(costs, key=shard_key):
+        home = int(shard_key(name), 16) % count
+        loads[home] += costs[name]
+        shards[home].append(name)
+    average = sum(loads) / count
+    while True:
+        heaviest = max(range(count), key=lambda i: (loads[i], -i))
+        lightest = min(range(count), key=lambda i: (loads[i], i))
+        if loads[heaviest] <= average * (1 + drift):
+            break
+        # moving a project cheaper than the gap always lowers the spread, so this terminates
+        movable = [name for name in shards[heaviest] if 0 < costs[name] < loads[heaviest] - loads[lightest]]
+        if not movable:
+            break
+        name = min(movable, key=shard_key)
+        shards[heaviest].remove(name)
+        shards[lightest].append(name)
+        loads[heaviest] -= costs[name]
+        loads[lightest] += costs[name]
+    return shards, loads
+
+
+def is_selected(project, args):
+    if args.tags and not set(args.tags) & set(project.get("tags", [])):
+        return False
+    traffic = project.get("mem traffic")
+    if args.min_traffic and (traffic is None or traffic < args.min_traffic):
+        return False
+    if args.max_traffic and (traffic is None or traffic > args.max_traffic):
+        return False
+    return True
+
+
+def selected_projects(args, kind, is_suitable=lambda project: True, generators=cmake_generators):
+    project_items = [(name, read_conf_if_needed(project)) for name, project in projects.items()]
+    project_items = [(name, project) for name, project in project_items if is_suitable(project) and is_selected(project, args)]
+    if not args.shard:
+        return project_items
+
+    index, count = parse_shard(args.shard)
+    durations = load_durations(kind, args.durations) if args.durations else {}
+    costs = estimated_costs(project_items, durations, generators)
+    shards, loads = partition(costs, count)
+    print("shard {0}: {1} projects, estimated cost {2:.0f} of {3:.0f}".format(args.shard, len(shards[index - 1]), loads[index - 1], sum(loads)), flush=True)
+    return [(name, project) for name, project in project_items if name in shards[index - 1]]
+
+
+def write_summary(summary_file, kind, results, runs=None):
+    # `runs` are the inspectcode statuses (runner.RunStatus.to_json) per project
+    summary = {"kind": kind, "results": dict(results)}
+    if runs is not None:
+        summary["runs"] = runs
+    with open(summary_file, "w") as f:
+        json.dump(summary, f, indent=4)
+
+
 argparser = ArgumentParser()
 argparser.add_argument("-p", "--project", dest="project")
+argparser.add_argument("--shard", dest="shard", help="i/N, run only the i-th of N cost-balanced parts of the project list")
+argparser.add_argument("--durations", dest="durations",
+                       help="durations file shared by all shards (see MergeDurations.py), used to balance them")
+argparser.add_argument("--tag", dest="tags", action="append", help="run only projects with the tag")
+argparser.add_argument("--min-traffic", dest="min_traffic", type=int, help="run only projects with at least this mem traffic (MB)")
+argparser.add_argument("--max-traffic", dest="max_traffic", type=int, help="run only projects with at most this mem traffic (MB)")
+argparser.add_argument("--timeout", dest="timeout", type=float, help="seconds after which inspectcode is killed, 0 means no limit")
+argparser.add_argument("--stall-timeout", dest="stall_timeout", type=float,
+                       help="seconds without inspectcode output after which it is killed, 0 means no limit")
+argparser.add_argument("--retries", dest="retries", type=int, help="count of restarts after a timeout or a failed launch")
+argparser.add_argument("--summary-file", dest="summary_file", help="store per-project results to merge them with other shards")
@@ -0,0 +1,39 @@
+from argparse import ArgumentParser
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+# Stand-in for inspectcode.x86.exe: accepts its command line and emits synthetic output and report.
+
+argparser = ArgumentParser()
+argparser.add_argument("--fake-files", dest="files", type=int, default=100)
+argparser.add_argument("--fake-issues", dest="issues", type=int, default=0)
+argparser.add_argument("--fake-duration", dest="duration", type=float, default=0.0)
+argparser.add_argument("--fake-exit-code", dest="exit_code", type=int, default=0)
+argparser.add_argument("-o", dest="output")
+args, _ = argparser.parse_known_args()
+
+
+def write_report(report_file, issues_count):
+    root = ET.Element("Report", ToolsVersion="fake")
+    ET.SubElement(root, "Information")
+    issue_types = ET.SubElement(root, "IssueTypes")
+    ET.SubElement(issue_types, "IssueType", Id="CppFake", Severity="ERROR")
+    project = ET.SubElement(ET.SubElement(root, "Issues"), "Project", Name="fake")
+    for i in range(issues_count):
+        ET.SubElement(project, "Issue", TypeId="CppFake", File="src\\file{0}.cpp".format(i % 1000),
+                      Line=str(i + 1), Message="Fake error {0}".format(i % 50))
+    ET.ElementTree(root).write(report_file, encoding="utf-8", xml_declaration=True)
+
+
+step = args.duration / (args.files + 2)
+print("Loading solution", flush=True)
+time.sleep(step)
+print("Indexing files", flush=True)
+time.sleep(step)
+for i in range(args.files):
+    print("Inspecting src\\file{0}.cpp".format(i), flush=True)
+    time.sleep(step)
+if args.output:
+    write_report(args.output, args.issues)
+sys.exit(args.exit_code)
@@ -0,0 +1,193 @@
+from os import path, makedirs
+from subprocess import PIPE
+from contextlib import contextmanager
+import subprocess
+import json
+import os
+import shutil
+import time
+
+stamp_file_name = "rscpp-sources.json"
+
+
+def git(args, repo_dir, **kwargs):
+    return subprocess.run(["git"] + args, cwd=repo_dir, stdout=PIPE, stderr=PIPE, text=True, **kwargs)
+
+
+@contextmanager
+def locked(directory, name="rscpp-fetch.lock", stale_after=3600):
+    # concurrent shallow fetches into the same repository fail on `shallow.lock`
+    lock_path = path.join(directory, name)
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - path.getmtime(lock_path) > stale_after:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(1)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+def init_object_store(store_dir):
+    if not path.exists(path.join(store_dir, "HEAD")):
+        makedirs(store_dir, exist_ok=True)
+        git(["init", "--bare"], store_dir, check=True)
+        git(["config", "gc.auto", "0"], store_dir, check=True)
+
+
+def has_commit(repo_dir, commit):
+    return git(["cat-file", "-e", commit + "^{commit}"], repo_dir).returncode == 0
+
+
+def resolve_pinned(repo_dir, commit):
+    result = git(["rev-parse", "--verify", "-q", "refs/pinned/" + commit + "^{commit}"], repo_dir)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def fetch_into_store(store_dir, url, commit):
+    # `commit` may be a tag as well, so the pinned ref is resolved to the SHA that is actually checked out
+    with locked(store_dir):
+        sha = resolve_pinned(store_dir, commit)
+        if sha:
+            return sha
+        if has_commit(store_dir, commit):
+            git(["update-ref", "refs/pinned/" + commit, commit], store_dir, check=True)
+            return resolve_pinned(store_dir, commit)
+        pinned_ref = "{0}:refs/pinned/{0}".format(commit)
+        if git(["fetch", "--depth=1", url, pinned_ref], store_dir).returncode != 0:
+            # the server doesn't allow to fetch unadvertised commits, so take the whole history
+            remote_refs = "refs/remotes/" + url_key(url)
+            git(["fetch", url, "+refs/heads/*:" + remote_refs + "/*", "+refs/tags/*:" + remote_refs + "/tags/*"],
+                store_dir, check=True)
+            tag_ref = remote_refs + "/tags/" + commit
+            pinned = tag_ref if git(["rev-parse", "--verify", "-q", tag_ref], store_dir).returncode == 0 else commit
+            git(["update-ref", "refs/pinned/" + commit, pinned], store_dir, check=True)
+        return resolve_pinned(store_dir, commit)
+
+
+def url_key(url):
+    return "".join(c if c.isalnum() else "_" for c in url)
+
+
+def read_head(repo_dir):
+    try:
+        with open(path.join(repo_dir, ".git", "HEAD")) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def read_stamp(repo_dir):
+    try:
+        with open(path.join(repo_dir, ".git", stamp_file_name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_stamp(repo_dir, sources):
+    with open(path.join(repo_dir, ".git", stamp_file_name), "w") as f:
+        json.dump(sources, f)
+
+
+def is_up_to_date(repo_dir, sha):
+    if not sha or read_head(repo_dir) != sha:
+        return False
+    # without a refresh any file with a changed mtime (e.g. after touching or restoring it) is reported as modified
+    git(["update-index", "-q", "--refresh"], repo_dir)
+    return git(["diff-index", "--quiet", "HEAD", "--"], repo_dir).returncode == 0
+
+
+def checkout(store_dir, repo_dir, url, commit):
+    if path.isfile(path.join(repo_dir, ".git")):
+        # a submodule cloned by `git submodule update` outside the store
+        shutil.rmtree(repo_dir)
+    if not path.exists(path.join(repo_dir, ".git")):
+        makedirs(repo_dir, exist_ok=True)
+        git(["init"], repo_dir, check=True)
+    alternates = path.join(repo_dir, ".git", "objects", "info", "alternates")
+    if not path.exists(alternates):
+        makedirs(path.dirname(alternates), exist_ok=True)
+        with open(alternates, "w") as f:
+            f.write(path.abspath(path.join(store_dir, "objects")) + "\n")
+
+    sha = fetch_into_store(store_dir, url, commit)
+    if not has_commit(repo_dir, sha):
+        # all objects are available through alternates, so this only records the shallow boundary
+        git(["fetch", "--depth=1", store_dir, "refs/pinned/" + commit], repo_dir, check=True)
+    git(["checkout", "--force", "--detach", sha], repo_dir, check=True)
+    git(["reset", "--hard"], repo_dir, check=True)
+    return sha
+
+
+def resolve_url(base_url, url):
+    # relative submodule urls are relative to the superproject url
+    if not url.startswith("./") and not url.startswith("../"):
+        return url
+    base_url = base_url.rstrip("/")
+    while True:
+        if url.startswith("./"):
+            url = url[2:]
+        elif url.startswith("../"):
+            base_url = base_url.rsplit("/", 1)[0]
+            url = url[3:]
+        else:
+            return base_url + "/" + url
+
+
+def submodules(repo_dir, url):
+    # (path, url, commit) of the submodules of the checked out commit
+    config = git(["config", "-f", ".gitmodules", "--get-regexp", r"^submodule\..*\.(path|url)$"], repo_dir)
+    if config.returncode != 0:
+        return []
+    fields = {}
+    for line in config.stdout.splitlines():
+        key, value = line.split(" ", 1)
+        name, field = key[len("submodule."):].rsplit(".", 1)
+        fields.setdefault(name, {})[field] = value
+    result = []
+    for name, submodule in fields.items():
+        if "path" not in submodule or "url" not in submodule:
+            continue
+        entry = git(["ls-tree", "HEAD", submodule["path"]], repo_dir).stdout.split()
+        if len(entry) >= 3 and entry[1] == "commit":
+            result.append((submodule["path"], resolve_url(url, submodule["url"]), entry[2]))
+    return result
+
+
+def get_sources(store_dir, project_input, target_dir):
+    subrepo = project_input.get("subrepo")
+    subrepo_dir = path.join(target_dir, subrepo["path"]) if subrepo else None
+
+    # the stamp keeps the SHAs the pinned names were resolved to, tags are compared by them
+    stamp = read_stamp(target_dir)
+    if stamp and stamp.get("sources") == project_input and is_up_to_date(target_dir, stamp.get("commit")):
+        if not subrepo or is_up_to_date(subrepo_dir, stamp.get("subrepo commit")):
+            return
+
+    stamp_path = path.join(target_dir, ".git", stamp_file_name)
+    if path.exists(stamp_path):
+        os.remove(stamp_path)
+    init_object_store(store_dir)
+    stamp = {"sources": project_input}
+    stamp["commit"] = checkout(store_dir, target_dir, project_input["repo"], project_input["commit"])
+    if subrepo:
+        stamp["subrepo commit"] = checkout(store_dir, subrepo_dir, subrepo["url"], subrepo["commit"])
+
+    custom_update_source_script = project_input.get("custom update source script")
+    if custom_update_source_script:
+        subprocess.run(custom_update_source_script, cwd=target_dir, check=True, stdout=PIPE, stderr=PIPE)
+
+    # submodules are fetched through the store as well, they are covered by the superproject's is_up_to_date
+    for submodule_path, submodule_url, submodule_commit in submodules(target_dir, project_input["repo"]):
+        checkout(store_dir, path.join(target_dir, submodule_path), submodule_url, submodule_commit)
+    write_stamp(target_dir, stamp)
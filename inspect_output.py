@@ -0,0 +1,92 @@
+import re
+import time
+
+import resource_sampler
+import runner
+
+inspecting_prefix = "Inspecting "
+
+# a phase starts at the first output line matching its pattern and lasts until the next phase starts
+default_phase_markers = [
+    ("indexing", r"^(Indexing|Caching|Analyzing files)"),
+    ("inspection", "^" + inspecting_prefix),
+]
+
+
+class OutputTimeline:
+    def __init__(self, phase_markers=None):
+        self.phase_markers = [(name, re.compile(pattern)) for name, pattern in (phase_markers or default_phase_markers)]
+        self.start = time.monotonic()
+        self.end = None
+        self.phases = [("solution load", self.start)]
+        self.files = []
+        self.lines = []
+        self.resources = None
+
+    def feed(self, line):
+        now = time.monotonic()
+        self.lines.append(line)
+        if line.startswith(inspecting_prefix):
+            self.files.append((line[len(inspecting_prefix):].strip(), now))
+        for index, (name, pattern) in enumerate(self.phase_markers):
+            if self.current_phase_index() < index and pattern.search(line):
+                self.phases.append((name, now))
+                break
+
+    def current_phase_index(self):
+        name = self.phases[-1][0]
+        for index, (phase_name, _) in enumerate(self.phase_markers):
+            if phase_name == name:
+                return index
+        return -1
+
+    def finish(self):
+        self.end = time.monotonic()
+
+    def output(self):
+        return "".join(self.lines)
+
+    def inspected_files_count(self):
+        return len(self.files)
+
+    def phase_durations(self):
+        result = {}
+        for (name, start), (_, end) in zip(self.phases, self.phases[1:] + [(None, self.end)]):
+            result[name] = end - start
+        return result
+
+    def largest_file_gaps(self, count):
+        # Gaps between consecutive "Inspecting" lines. They are durations of the files only with -j=1:
+        # with parallel inspection the lines interleave. The last file is left out, its gap would include
+        # writing of the report.
+        gaps = []
+        for (file, start), (_, end) in zip(self.files, self.files[1:]):
+            gaps.append({"file": file, "gap": end - start})
+        gaps.sort(key=lambda g: g["gap"], reverse=True)
+        return gaps[:count]
+
+
+def run_and_trace(args, phase_markers=None, sample_interval=None, timeout=None, stall_timeout=None, retries=0, **kwargs):
+    # a retried run starts with a fresh timeline and sampler
+    state = {"timeline": OutputTimeline(phase_markers), "sampler": None}
+
+    def stop_sampler():
+        if state["sampler"]:
+            state["sampler"].stop()
+            state["timeline"].resources = state["sampler"].result()
+            state["sampler"] = None
+
+    def on_start(pid):
+        stop_sampler()
+        state["timeline"] = OutputTimeline(phase_markers)
+        if sample_interval and resource_sampler.is_supported():
+            state["sampler"] = resource_sampler.ResourceSampler(pid, sample_interval)
+            state["sampler"].start()
+
+    def on_line(line):
+        state["timeline"].feed(line)
+
+    status = runner.run(args, on_line, on_start, timeout, stall_timeout, retries, **kwargs)
+    state["timeline"].finish()
+    stop_sampler()
+    return status, state["timeline"]
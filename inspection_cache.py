@@ -0,0 +1,113 @@
+from os import path, makedirs
+import hashlib
+import json
+import os
+import shutil
+
+binary_extensions = (".dll", ".exe")
+build_hashes = {}
+
+
+def file_sha256(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def build_hash(build_dir, cache_dir):
+    # Hashing the whole build takes a while, so file hashes are remembered along with their size and mtime.
+    if build_dir in build_hashes:
+        return build_hashes[build_dir]
+    memo_path = path.join(cache_dir, "binaries.json")
+    try:
+        with open(memo_path) as f:
+            memo = json.load(f)
+    except (OSError, ValueError):
+        memo = {}
+    new_memo = {}
+    sha256 = hashlib.sha256()
+    for root, dirs, files in os.walk(build_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith(binary_extensions):
+                continue
+            file_path = path.join(root, name)
+            stat = os.stat(file_path)
+            entry = memo.get(file_path)
+            if not entry or entry[0] != stat.st_size or entry[1] != stat.st_mtime:
+                entry = [stat.st_size, stat.st_mtime, file_sha256(file_path)]
+            new_memo[file_path] = entry
+            sha256.update(path.relpath(file_path, build_dir).encode())
+            sha256.update(entry[2].encode())
+    makedirs(cache_dir, exist_ok=True)
+    with open(memo_path, "w") as f:
+        json.dump(new_memo, f)
+    build_hashes[build_dir] = sha256.hexdigest()
+    return build_hashes[build_dir]
+
+
+def cache_key(build_digest, project, configuration, sln_file, inspect_code_args):
+    # Only the inputs of the inspection are hashed, so editing expectations ("known errors",
+    # "inspected files count", "mem traffic") in the project config keeps the cached results.
+    # `configuration` stands for everything that produced the solution: cmake options and defines change
+    # only the project files, not the .sln itself.
+    inputs = {
+        "build": build_digest,
+        "sources": project["sources"],
+        "project to check": project.get("project to check"),
+        "msbuild properties": project.get("msbuild properties"),
+        "configuration": configuration,
+        "sln file": sln_file,
+        "solution": file_sha256(sln_file),
+        "settings": file_sha256(sln_file + ".DotSettings"),
+        "arguments": inspect_code_args,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def lookup(cache_dir, key, report_file):
+    entry_dir = path.join(cache_dir, key)
+    meta_path = path.join(entry_dir, "meta.json")
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        shutil.copyfile(path.join(entry_dir, "resharper-report.xml"), report_file)
+    except (OSError, ValueError):
+        return None
+    # the mtime of meta.json is the last use time for the eviction
+    os.utime(meta_path)
+    return meta
+
+
+def store(cache_dir, key, report_file, meta, max_size):
+    entry_dir = path.join(cache_dir, key)
+    tmp_dir = entry_dir + ".tmp"
+    if path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    makedirs(tmp_dir)
+    shutil.copyfile(report_file, path.join(tmp_dir, "resharper-report.xml"))
+    with open(path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    if path.exists(entry_dir):
+        shutil.rmtree(entry_dir)
+    os.replace(tmp_dir, entry_dir)
+    evict(cache_dir, max_size)
+
+
+def evict(cache_dir, max_size):
+    entries = []
+    total_size = 0
+    for entry in os.scandir(cache_dir):
+        meta_path = path.join(entry.path, "meta.json")
+        if not entry.is_dir() or not path.exists(meta_path):
+            continue
+        size = sum(path.getsize(path.join(entry.path, name)) for name in os.listdir(entry.path))
+        entries.append((path.getmtime(meta_path), size, entry.path))
+        total_size += size
+    for _, size, entry_path in sorted(entries):
+        if total_size <= max_size:
+            break
+        shutil.rmtree(entry_path, ignore_errors=True)
+        total_size -= size
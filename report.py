@@ -0,0 +1,95 @@
+from argparse import ArgumentParser
+import xml.etree.ElementTree as ET
+import json
+
+
+def normalize_path(file):
+    file = file.replace("\\", "/").lower()
+    while file.startswith("./"):
+        file = file[2:]
+    return file
+
+
+def iter_issues(report_file):
+    # Handled elements are detached from their parents right away, so memory doesn't grow with the size of the report.
+    parents = []
+    for event, elem in ET.iterparse(report_file, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            continue
+        parents.pop()
+        if elem.tag == "Issue":
+            yield elem.get("File"), elem.get("Line"), elem.get("Message")
+        if parents and elem.tag in ("Issue", "Project", "IssueType", "IssueTypes", "Issues"):
+            parents[-1].remove(elem)
+
+
+class IssueIndex:
+    def __init__(self, issues=()):
+        # normalized file -> set of (line, message)
+        self.by_file = {}
+        self.file_names = {}
+        self.count = 0
+        for file, line, message in issues:
+            self.add(file, line, message)
+
+    def add(self, file, line, message):
+        key = normalize_path(file or "")
+        entries = self.by_file.setdefault(key, set())
+        if (line, message) not in entries:
+            entries.add((line, message))
+            self.file_names.setdefault(key, file)
+            self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def difference(self, other):
+        result = []
+        for key, entries in self.by_file.items():
+            other_entries = other.by_file.get(key, ())
+            for line, message in entries:
+                if (line, message) not in other_entries:
+                    result.append((self.file_names[key], line, message))
+        return result
+
+
+def read_report(report_file):
+    return IssueIndex(iter_issues(report_file))
+
+
+def index_known_errors(known_errors):
+    return IssueIndex((issue["file"], issue["line"], issue["message"]) for issue in known_errors)
+
+
+def group_by_file_and_message(issues):
+    groups = {}
+    for file, line, message in issues:
+        groups.setdefault((normalize_path(file or ""), message), []).append(line)
+    return groups
+
+
+def print_grouped(title, issues):
+    if not issues:
+        return
+    print("{0} ({1}):".format(title, len(issues)))
+    for (file, message), lines in sorted(group_by_file_and_message(issues).items()):
+        print(json.dumps({"file": file, "message": message, "lines": sorted(lines, key=lambda l: int(l) if l and l.isdigit() else 0)}))
+
+
+def diff_reports(base_report, new_report):
+    base = read_report(base_report)
+    new = read_report(new_report)
+    return new.difference(base), base.difference(new)
+
+
+if __name__ == "__main__":
+    argparser = ArgumentParser(description="compare two resharper-report.xml files")
+    argparser.add_argument("base")
+    argparser.add_argument("new")
+    args = argparser.parse_args()
+    added, removed = diff_reports(args.base, args.new)
+    print_grouped("Added", added)
+    print_grouped("Removed", removed)
+    if not added and not removed:
+        print("Reports are equal")
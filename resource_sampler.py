@@ -0,0 +1,201 @@
+from os import path
+import os
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+use_procfs = path.exists("/proc/self/stat")
+clock_ticks = os.sysconf("SC_CLK_TCK") if use_procfs else None
+has_children_files = use_procfs and path.exists("/proc/self/task/{0}/children".format(os.getpid()))
+
+
+def read_procfs(pid):
+    with open("/proc/{0}/stat".format(pid)) as f:
+        stat = f.read()
+    # the command name may contain spaces, so the fields are counted from the closing parenthesis
+    fields = stat[stat.rfind(")") + 2:].split()
+    result = {
+        "ppid": int(fields[1]),
+        "user": int(fields[11]) / clock_ticks,
+        "system": int(fields[12]) / clock_ticks,
+        "rss": 0,
+        "ctx switches": 0,
+        "read bytes": 0,
+        "write bytes": 0,
+    }
+    with open("/proc/{0}/status".format(pid)) as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                result["rss"] = int(line.split()[1]) * 1024
+            elif line.startswith(("voluntary_ctxt_switches:", "nonvoluntary_ctxt_switches:")):
+                result["ctx switches"] += int(line.split()[1])
+    try:
+        with open("/proc/{0}/io".format(pid)) as f:
+            for line in f:
+                key, value = line.split(":")
+                if key == "read_bytes":
+                    result["read bytes"] = int(value)
+                elif key == "write_bytes":
+                    result["write bytes"] = int(value)
+    except OSError:
+        pass
+    return result
+
+
+def procfs_children(pid):
+    children = []
+    for task in os.listdir("/proc/{0}/task".format(pid)):
+        with open("/proc/{0}/task/{1}/children".format(pid, task)) as f:
+            children.extend(int(child) for child in f.read().split())
+    return children
+
+
+def procfs_scan_tree(root_pid):
+    # kernels without /proc/<pid>/task/<tid>/children: every process has to be read to find the children
+    processes = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                processes[int(entry)] = read_procfs(entry)
+            except (OSError, ValueError, IndexError):
+                pass
+    tree = {}
+    to_visit = [root_pid]
+    while to_visit:
+        pid = to_visit.pop()
+        if pid in processes:
+            tree[pid] = processes[pid]
+            to_visit.extend(child for child, info in processes.items() if info["ppid"] == pid)
+    return tree
+
+
+def procfs_tree(root_pid):
+    if not has_children_files:
+        return procfs_scan_tree(root_pid)
+    tree = {}
+    to_visit = [root_pid]
+    while to_visit:
+        pid = to_visit.pop()
+        try:
+            tree[pid] = read_procfs(pid)
+            to_visit.extend(procfs_children(pid))
+        except (OSError, ValueError, IndexError):
+            # the process has exited meanwhile
+            pass
+    return tree
+
+
+def psutil_tree(root_pid):
+    tree = {}
+    try:
+        root = psutil.Process(root_pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return tree
+    for process in processes:
+        try:
+            with process.oneshot():
+                cpu = process.cpu_times()
+                ctx = process.num_ctx_switches()
+                info = {
+                    "user": cpu.user,
+                    "system": cpu.system,
+                    "rss": process.memory_info().rss,
+                    "ctx switches": ctx.voluntary + ctx.involuntary,
+                    "read bytes": 0,
+                    "write bytes": 0,
+                }
+                if hasattr(process, "io_counters"):
+                    io = process.io_counters()
+                    info["read bytes"] = io.read_bytes
+                    info["write bytes"] = io.write_bytes
+            tree[process.pid] = info
+        except psutil.Error:
+            pass
+    return tree
+
+
+def children_usage():
+    # usage of the terminated and waited for children, including their own waited for descendants
+    return resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+
+
+def usage_delta(before, after):
+    return {
+        "user time": after.ru_utime - before.ru_utime,
+        "system time": after.ru_stime - before.ru_stime,
+        "ctx switches": (after.ru_nvcsw + after.ru_nivcsw) - (before.ru_nvcsw + before.ru_nivcsw),
+        "read bytes": (after.ru_inblock - before.ru_inblock) * 512,
+        "write bytes": (after.ru_oublock - before.ru_oublock) * 512,
+    }
+
+
+def is_supported():
+    return use_procfs or psutil is not None
+
+
+class ResourceSampler(threading.Thread):
+    def __init__(self, pid, interval):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.samples = 0
+        self.peak_rss = 0
+        self.total_rss = 0
+        # counters are cumulative per process, so the last seen value of every process of the tree is kept
+        self.counters = {}
+        # Sampled counters miss the time since the last sample and processes which lived between two samples,
+        # so the totals are taken from the rusage of the children when it's available. It assumes that
+        # no other child of the harness terminates while the process is running.
+        self.usage_before = children_usage()
+        self.usage_after = None
+
+    def sample(self):
+        tree = procfs_tree(self.pid) if use_procfs else psutil_tree(self.pid)
+        if not tree:
+            return
+        rss = sum(info["rss"] for info in tree.values())
+        self.peak_rss = max(self.peak_rss, rss)
+        self.total_rss += rss
+        self.samples += 1
+        for pid, info in tree.items():
+            self.counters[pid] = info
+
+    def run(self):
+        while True:
+            self.sample()
+            if self.stopped.wait(self.interval):
+                break
+
+    def stop(self):
+        # the process must have been waited for already
+        self.stopped.set()
+        self.join()
+        self.usage_after = children_usage()
+
+    def result(self):
+        def total(key):
+            return sum(info[key] for info in self.counters.values())
+
+        result = {
+            "samples": self.samples,
+            "peak rss": self.peak_rss,
+            "average rss": self.total_rss // self.samples if self.samples else 0,
+            "user time": total("user"),
+            "system time": total("system"),
+            "ctx switches": total("ctx switches"),
+            "read bytes": total("read bytes"),
+            "write bytes": total("write bytes"),
+        }
+        if self.usage_before and self.usage_after:
+            result.update(usage_delta(self.usage_before, self.usage_after))
+        return result
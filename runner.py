@@ -0,0 +1,133 @@
+from subprocess import PIPE
+import asyncio
+import locale
+import os
+import signal
+import subprocess
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class RunStatus:
+    # kind is one of "exited", "timeout", "stalled" and "launch error"; all but "exited" are infrastructure
+    # failures, which are retried, while a process that exited by itself is never retried whatever its exit code is
+    def __init__(self, kind, exit_code=None, elapsed=0.0, message=None):
+        self.kind = kind
+        self.exit_code = exit_code
+        self.elapsed = elapsed
+        self.message = message
+        self.attempts = 1
+        # statuses of the runs which were retried before this one
+        self.failed_attempts = []
+
+    def is_infrastructure_failure(self):
+        return self.kind != "exited"
+
+    def succeeded(self, expected_exit_code=0):
+        return self.kind == "exited" and self.exit_code == expected_exit_code
+
+    def describe(self):
+        if self.kind == "exited":
+            return "exit code {0}".format(self.exit_code)
+        if self.kind == "timeout":
+            return "timed out after {0:.0f}s".format(self.elapsed)
+        if self.kind == "stalled":
+            return "killed after {0}".format(self.message)
+        return "failed to start: {0}".format(self.message)
+
+    def to_json(self):
+        return {"kind": self.kind, "exit code": self.exit_code, "elapsed": self.elapsed,
+                "attempts": self.attempts, "message": self.message,
+                "failed attempts": [status.to_json() for status in self.failed_attempts]}
+
+
+def kill_tree(pid):
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            processes = root.children(recursive=True) + [root]
+        except psutil.Error:
+            return
+        for process in processes:
+            try:
+                process.kill()
+            except psutil.Error:
+                pass
+    elif os.name == "nt":
+        subprocess.run(["taskkill", "/T", "/F", "/PID", str(pid)], stdout=PIPE, stderr=PIPE)
+    else:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def pinned(cores):
+    # Popen arguments which start the process on the given cores; the affinity is set before exec,
+    # so all the descendants inherit it
+    if cores and hasattr(os, "sched_setaffinity"):
+        return {"preexec_fn": lambda: os.sched_setaffinity(0, cores)}
+    return {}
+
+
+def pin_started(pid, cores):
+    # without sched_setaffinity the process can only be pinned once it's started
+    if cores and not hasattr(os, "sched_setaffinity") and psutil is not None:
+        try:
+            psutil.Process(pid).cpu_affinity(cores)
+        except psutil.Error:
+            pass
+
+
+async def run_once(args, on_line, on_start, timeout, stall_timeout, cores=None, **kwargs):
+    encoding = locale.getpreferredencoding(False)
+    if os.name != "nt":
+        # a separate process group allows to kill the whole tree without psutil
+        kwargs.setdefault("start_new_session", True)
+    start = time.monotonic()
+    try:
+        process = await asyncio.create_subprocess_exec(*args, stdout=PIPE, limit=1 << 20, **kwargs, **pinned(cores))
+    except OSError as e:
+        return RunStatus("launch error", message=str(e))
+    pin_started(process.pid, cores)
+    on_start(process.pid)
+
+    kind = "exited"
+    message = None
+    deadline = start + timeout if timeout else None
+    while True:
+        wait = stall_timeout
+        if deadline:
+            remaining = max(0, deadline - time.monotonic())
+            wait = min(wait, remaining) if wait else remaining
+        try:
+            line = await asyncio.wait_for(process.stdout.readline(), wait)
+        except asyncio.TimeoutError:
+            if deadline and time.monotonic() >= deadline:
+                kind = "timeout"
+            else:
+                kind = "stalled"
+                message = "no output for {0:.0f}s".format(stall_timeout)
+            kill_tree(process.pid)
+            break
+        if not line:
+            break
+        on_line(line.decode(encoding, errors="replace").replace("\r\n", "\n"))
+    exit_code = await process.wait()
+    return RunStatus(kind, exit_code, time.monotonic() - start, message)
+
+
+def run(args, on_line, on_start=lambda pid: None, timeout=None, stall_timeout=None, retries=0, **kwargs):
+    failed_attempts = []
+    for attempt in range(retries + 1):
+        status = asyncio.run(run_once(args, on_line, on_start, timeout, stall_timeout, **kwargs))
+        status.attempts = attempt + 1
+        status.failed_attempts = failed_attempts
+        if not status.is_infrastructure_failure() or attempt == retries:
+            return status
+        print("{0}, retrying...".format(status.describe()), flush=True)
+        failed_attempts = failed_attempts + [status]
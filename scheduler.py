@@ -0,0 +1,41 @@
+import subprocess
+import tempfile
+import time
+
+
+def run_scheduled(tasks, concurrency, cores, memory_budget, launch, on_finish, poll_interval=1.0):
+    # Tasks are (name, cost, memory) tuples. The most expensive tasks are started first, at most `concurrency`
+    # at once, while the sum of memory estimates of running tasks fits into `memory_budget` (a task is always
+    # started when nothing else runs). Every task gets an equal share of `cores`.
+    # `launch(name, slots, stdout)` starts a process; `on_finish(name, exit_code, output, elapsed)` gets its results.
+    pending = sorted(tasks, key=lambda task: task[1], reverse=True)
+    slots = max(1, cores // concurrency)
+    running = []
+
+    def used_memory():
+        return sum(task[2] for task, _, _, _ in running)
+
+    while pending or running:
+        while len(running) < concurrency:
+            fitting = [task for task in pending if not running or not memory_budget or used_memory() + task[2] <= memory_budget]
+            if not fitting:
+                break
+            task = fitting[0]
+            pending.remove(task)
+            output = tempfile.TemporaryFile(mode="w+")
+            running.append((task, launch(task[0], slots, output), output, time.time()))
+
+        time.sleep(poll_interval)
+        for entry in list(running):
+            task, process, output, start = entry
+            exit_code = process.poll()
+            if exit_code is None:
+                continue
+            running.remove(entry)
+            output.seek(0)
+            on_finish(task[0], exit_code, output.read(), time.time() - start)
+            output.close()
+
+
+def launch_script(args, stdout):
+    return subprocess.Popen(args, stdout=stdout, stderr=subprocess.STDOUT, text=True)
@@ -0,0 +1,94 @@
+import math
+import random
+import statistics
+
+# scales MAD to be a consistent estimator of the standard deviation for normally distributed data
+mad_scale = 1.4826
+
+
+def median(values):
+    return statistics.median(values)
+
+
+def mad(values):
+    m = median(values)
+    return median([abs(v - m) for v in values])
+
+
+def bootstrap_ci(values, confidence=0.95, resamples=2000, estimator=median, seed=0):
+    if len(values) < 2:
+        return values[0], values[0]
+    rng = random.Random(seed)
+    estimates = sorted(estimator(rng.choices(values, k=len(values))) for _ in range(resamples))
+    tail = (1 - confidence) / 2
+    low = estimates[int(tail * (resamples - 1))]
+    high = estimates[int((1 - tail) * (resamples - 1))]
+    return low, high
+
+
+def outliers(values, threshold=3.5):
+    m = median(values)
+    spread = mad(values) * mad_scale
+    if spread == 0:
+        return []
+    return [i for i, v in enumerate(values) if abs(v - m) / spread > threshold]
+
+
+def warmup_count(values, threshold=3.5):
+    # leading attempts which are slower outliers are considered to be a part of the warmup
+    slow_outliers = set(i for i in outliers(values, threshold) if values[i] > median(values))
+    count = 0
+    while count in slow_outliers:
+        count += 1
+    return count
+
+
+def relative_ci_width(values, confidence=0.95):
+    low, high = bootstrap_ci(values, confidence)
+    return (high - low) / median(values) * 100
+
+
+def summary(values, confidence=0.95):
+    warmup = warmup_count(values)
+    steady = values[warmup:]
+    low, high = bootstrap_ci(steady, confidence)
+    return {
+        "median": median(steady),
+        "mad": mad(steady),
+        "ci": [low, high],
+        "confidence": confidence,
+        "warmup attempts": warmup,
+        "outliers": [i + warmup for i in outliers(steady)],
+    }
+
+
+def ranks(values):
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    result = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            result[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return result
+
+
+def mann_whitney(a, b):
+    # two-sided p-value of the Mann-Whitney U test using the normal approximation with tie correction
+    n1, n2 = len(a), len(b)
+    combined = list(a) + list(b)
+    r = ranks(combined)
+    u = sum(r[:n1]) - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    tie_sizes = {}
+    for v in combined:
+        tie_sizes[v] = tie_sizes.get(v, 0) + 1
+    tie_term = sum(t ** 3 - t for t in tie_sizes.values()) / (n * (n - 1))
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term))
+    if sigma == 0:
+        return 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / sigma
+    return min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
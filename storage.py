@@ -0,0 +1,195 @@
+from os import path, makedirs
+from contextlib import contextmanager
+import json
+import os
+import shutil
+import time
+
+import git_sources
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Registry of disk consuming artifacts (checkouts, build directories, caches, snapshots) with their sizes and
+# last use times. Sizes are measured lazily: only for artifacts used since the previous measurement.
+
+
+def registry_path(root_dir):
+    return path.join(root_dir, "storage.json")
+
+
+def load(root_dir):
+    try:
+        with open(registry_path(root_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save(root_dir, registry):
+    tmp_file = registry_path(root_dir) + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(registry, f, indent=4)
+    os.replace(tmp_file, registry_path(root_dir))
+
+
+def touch(root_dir, artifact_path, kind, project_name=None, uses=()):
+    # `uses` are shared artifacts the artifact can't live without, e.g. the git object store of a checkout
+    makedirs(root_dir, exist_ok=True)
+    with git_sources.locked(root_dir, "rscpp-storage.lock"):
+        registry = load(root_dir)
+        entry = registry.setdefault(path.abspath(artifact_path), {"kind": kind, "project": project_name, "size": None})
+        entry["last used"] = time.time()
+        if uses:
+            entry["uses"] = sorted(set(entry.get("uses", [])) | set(path.abspath(p) for p in uses))
+        save(root_dir, registry)
+
+
+def in_use_dir(root_dir):
+    return path.join(root_dir, "in-use")
+
+
+def is_alive(pid):
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if os.name != "posix":
+        # os.kill would terminate the process on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def in_use(root_dir, project_name):
+    # Artifacts of the project aren't evicted while the marker exists, e.g. by a concurrently checked project
+    # while inspectcode reads them. The marker is named after the holder's pid, so a crashed holder doesn't
+    # pin the project forever.
+    makedirs(in_use_dir(root_dir), exist_ok=True)
+    marker = path.join(in_use_dir(root_dir), "{0}.{1}".format(project_name, os.getpid()))
+    open(marker, "w").close()
+    try:
+        yield
+    finally:
+        os.remove(marker)
+
+
+def projects_in_use(root_dir):
+    try:
+        markers = os.listdir(in_use_dir(root_dir))
+    except OSError:
+        return set()
+    result = set()
+    for marker in markers:
+        project_name, _, pid = marker.rpartition(".")
+        if pid.isdigit() and is_alive(int(pid)):
+            result.add(project_name)
+        else:
+            try:
+                os.remove(path.join(in_use_dir(root_dir), marker))
+            except OSError:
+                pass
+    return result
+
+
+def is_nested(artifact_path, parent_path):
+    return artifact_path != parent_path and artifact_path.startswith(parent_path.rstrip("/\\") + os.sep)
+
+
+def directory_size(directory, excluded):
+    total = 0
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if path.join(root, d) not in excluded]
+        for name in files:
+            try:
+                total += os.lstat(path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def measure(registry, refresh=False, skipped=()):
+    # Only artifacts which have never been measured are walked, unless `refresh` is set: walking big checkouts
+    # and caches is expensive, so sizes of reused artifacts are refreshed only when the budget is close.
+    for artifact_path, entry in list(registry.items()):
+        if not path.exists(artifact_path):
+            del registry[artifact_path]
+            continue
+        if artifact_path in skipped:
+            continue
+        if entry["size"] is None or (refresh and entry.get("measured", 0) < entry["last used"]):
+            # nested artifacts (e.g. build directories inside checkouts) are accounted separately
+            nested = set(p for p in registry if is_nested(p, artifact_path))
+            entry["size"] = directory_size(artifact_path, nested)
+            entry["measured"] = time.time()
+
+
+def eviction_closure(registry, artifact_path):
+    # nested artifacts and the artifacts using the evicted one are gone with it
+    result = [artifact_path]
+    for evicted in result:
+        for other, entry in registry.items():
+            if other not in result and (is_nested(other, evicted) or evicted in entry.get("uses", ())):
+                result.append(other)
+    return result
+
+
+def total_size(registry):
+    return sum(entry["size"] or 0 for entry in registry.values())
+
+
+def enforce_budget(root_dir, budget, pinned_paths=(), recent_projects=1, in_progress=(), refresh_margin=0.9):
+    # Evicts least recently used artifacts until the total size fits into the budget. Artifacts of the
+    # `recent_projects` most recently used projects, of the projects marked with `in_use`, `pinned_paths`
+    # and `in_progress` are never evicted; the latter are still being written, so they aren't measured either.
+    with git_sources.locked(root_dir, "rscpp-storage.lock"):
+        registry = load(root_dir)
+        in_progress = set(path.abspath(p) for p in in_progress)
+        measure(registry, skipped=in_progress)
+        total = total_size(registry)
+        if total > budget * refresh_margin:
+            measure(registry, refresh=True, skipped=in_progress)
+            total = total_size(registry)
+        by_recency = sorted(registry.items(), key=lambda item: item[1]["last used"], reverse=True)
+        recent = []
+        for _, entry in by_recency:
+            if entry["project"] and entry["project"] not in recent and len(recent) < recent_projects:
+                recent.append(entry["project"])
+        protected = set(recent) | projects_in_use(root_dir)
+        pinned = set(path.abspath(p) for p in pinned_paths) | in_progress
+        evicted = []
+        for artifact_path, entry in reversed(by_recency):
+            if total <= budget:
+                break
+            if artifact_path not in registry:
+                continue
+            closure = eviction_closure(registry, artifact_path)
+            if any(p in pinned or registry[p]["project"] in protected for p in closure):
+                continue
+            if any(is_nested(p, evicted_path) for p in pinned for evicted_path in closure):
+                continue
+            for p in closure:
+                evicted_entry = registry.pop(p)
+                print("evicting {0} {1} ({2} MB)".format(evicted_entry["kind"], p, (evicted_entry["size"] or 0) >> 20), flush=True)
+                shutil.rmtree(p, ignore_errors=True)
+                total -= evicted_entry["size"] or 0
+                evicted.append(p)
+        save(root_dir, registry)
+        return evicted, total
+
+
+def report(root_dir):
+    registry = load(root_dir)
+    measure(registry, refresh=True)
+    save(root_dir, registry)
+    rows = sorted(registry.items(), key=lambda item: item[1]["last used"], reverse=True)
+    for artifact_path, entry in rows:
+        last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last used"]))
+        print("{0:>10} MB  {1}  {2:9} {3}".format(entry["size"] >> 20, last_used, entry["kind"], artifact_path))
+    print("{0:>10} MB  total".format(sum(entry["size"] for entry in registry.values()) >> 20))
@@ -0,0 +1,126 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zipfile
+
+import zip_sources
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    # behaviour of the stand-in server is configured by the test through the server attributes
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.headers.get("Range"))
+        content = server.content
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and server.supports_range:
+            start = int(range_header[len("bytes="):].rstrip("-"))
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {0}-{1}/{2}".format(start, len(content) - 1, len(content)))
+        else:
+            self.send_response(200)
+        body = content[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if server.drops_left > 0:
+            server.drops_left -= 1
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_archive(root, files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(root + "/" + name, content)
+    return buffer.getvalue()
+
+
+class ZipSourcesTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        # larger than a download chunk, so an interrupted transfer leaves a partial file behind
+        self.content = make_archive("project-1.0", {"CMakeLists.txt": "project(test)\n", "data.bin": os.urandom(3 * zip_sources.chunk_size)})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ArchiveHandler)
+        self.server.content = self.content
+        self.server.supports_range = True
+        self.server.drops_left = 0
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:{0}/project.zip".format(self.server.server_address[1])
+        self.target_path = path.join(self.work_dir, "downloads", "project.zip")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.work_dir)
+
+    def read_target(self):
+        with open(self.target_path, "rb") as f:
+            return f.read()
+
+    def write_part(self, content):
+        os.makedirs(path.dirname(self.target_path))
+        with open(self.target_path + ".part", "wb") as f:
+            f.write(content)
+
+    def test_interrupted_download_is_resumed(self):
+        self.server.drops_left = 1
+        zip_sources.download(self.url, self.target_path, None)
+        self.assertEqual(self.read_target(), self.content)
+        self.assertEqual(self.server.requests[0], None)
+        self.assertTrue(self.server.requests[1].startswith("bytes="))
+        self.assertGreater(int(self.server.requests[1][len("bytes="):].rstrip("-")), 0)
+        self.assertFalse(path.exists(self.target_path + ".part"))
+
+    def test_range_ignored_by_server_restarts_download(self):
+        self.server.supports_range = False
+        self.write_part(b"garbage")
+        zip_sources.download(self.url, self.target_path, None)
+        self.assertEqual(self.read_target(), self.content)
+
+    def test_complete_part_is_taken_on_416(self):
+        self.write_part(self.content)
+        zip_sources.download(self.url, self.target_path, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(self.read_target(), self.content)
+        self.assertEqual(self.server.requests, ["bytes={0}-".format(len(self.content))])
+
+    def test_checksum_mismatch_removes_part(self):
+        with self.assertRaises(Exception):
+            zip_sources.download(self.url, self.target_path, "0" * 64)
+        self.assertFalse(path.exists(self.target_path))
+        self.assertFalse(path.exists(self.target_path + ".part"))
+
+    def test_corrupted_archive_is_downloaded_again(self):
+        downloads_dir = path.join(self.work_dir, "downloads")
+        os.makedirs(downloads_dir)
+        project_input = {"kind": "zip", "url": self.url, "root": "project-1.0"}
+        cache_name = hashlib.sha256(self.url.encode()).hexdigest()
+        with open(path.join(downloads_dir, cache_name + ".zip"), "wb") as f:
+            f.write(b"not a zip")
+        target_dir = path.join(self.work_dir, "project")
+        root_dir = zip_sources.get_sources(downloads_dir, project_input, target_dir)
+        self.assertTrue(path.exists(path.join(root_dir, "CMakeLists.txt")))
+        self.assertEqual(len(self.server.requests), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
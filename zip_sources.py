@@ -0,0 +1,92 @@
+from os import path, makedirs
+from zipfile import BadZipFile, ZipFile
+import hashlib
+import os
+import shutil
+import requests
+
+chunk_size = 1 << 20
+
+
+def file_sha256(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def download_part(url, part_path):
+    downloaded = path.getsize(part_path) if path.exists(part_path) else 0
+    headers = {"Range": "bytes={0}-".format(downloaded)} if downloaded else {}
+    with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+        if response.status_code == 416:
+            # the previous attempt has already received everything
+            return
+        response.raise_for_status()
+        mode = "ab" if response.status_code == 206 else "wb"
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+
+
+def download(url, target_path, expected_sha256, attempts=5):
+    if path.exists(target_path):
+        return target_path
+    makedirs(path.dirname(target_path), exist_ok=True)
+    part_path = target_path + ".part"
+    for attempt in range(attempts):
+        try:
+            download_part(url, part_path)
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+            if attempt == attempts - 1:
+                raise
+            print("download of {0} was interrupted, resuming...".format(url), flush=True)
+
+    if expected_sha256:
+        actual_sha256 = file_sha256(part_path)
+        if actual_sha256 != expected_sha256.lower():
+            os.remove(part_path)
+            raise Exception("checksum mismatch for {0}: expected {1}, actual {2}".format(url, expected_sha256, actual_sha256))
+    os.replace(part_path, target_path)
+    return target_path
+
+
+def extract_subtree(archive_path, root, target_dir):
+    prefix = root.replace("\\", "/").strip("/") + "/"
+    with ZipFile(archive_path) as zipfile:
+        for member in zipfile.infolist():
+            if member.filename.startswith(prefix) or member.filename == prefix[:-1]:
+                zipfile.extract(member, path=target_dir)
+
+
+def get_sources(downloads_dir, project_input, target_dir):
+    root_dir = path.join(target_dir, project_input["root"])
+    if path.exists(root_dir):
+        return root_dir
+
+    url = project_input["url"]
+    expected_sha256 = project_input.get("sha256")
+    cache_name = expected_sha256 or hashlib.sha256(url.encode()).hexdigest()
+    archive_path = path.join(downloads_dir, cache_name + ".zip")
+
+    # extract into a temporary directory first, so an interrupted extraction is not mistaken for sources
+    tmp_dir = target_dir + ".extracting"
+    for attempt in range(2):
+        download(url, archive_path, expected_sha256)
+        if path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        try:
+            extract_subtree(archive_path, project_input["root"], tmp_dir)
+            break
+        except BadZipFile:
+            # without a checksum a corrupted archive would be reused forever
+            os.remove(archive_path)
+            if attempt == 1:
+                raise
+            print("archive of {0} is corrupted, downloading it again...".format(url), flush=True)
+    makedirs(path.dirname(root_dir), exist_ok=True)
+    os.replace(path.join(tmp_dir, project_input["root"]), root_dir)
+    shutil.rmtree(tmp_dir)
+    return root_dir